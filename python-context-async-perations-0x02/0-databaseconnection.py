@@ -3,18 +3,24 @@
 Task 0: Custom class-based context manager for Database connection
 """
 
-import sqlite3
+from sqlite_profile import get_profile
 
 
 class DatabaseConnection:
-    """Custom context manager for handling SQLite connections"""
+    """Custom context manager for handling SQLite connections
 
-    def __init__(self, db_name="users.db"):
+    `profile` names the PRAGMA settings applied on connect (see
+    sqlite_profile.py): SQLite's defaults unless asked for, "fast" for
+    throughput (switches the file to WAL) or "reader" for read-only access.
+    """
+
+    def __init__(self, db_name="users.db", profile="default"):
         self.db_name = db_name
+        self.profile = get_profile(profile)
         self.conn = None
 
     def __enter__(self):
-        self.conn = sqlite3.connect(self.db_name)
+        self.conn = self.profile.connect(self.db_name)
         return self.conn
 
     def __exit__(self, exc_type, exc_value, traceback):
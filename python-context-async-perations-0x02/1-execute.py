@@ -3,28 +3,39 @@
 Task 1: Reusable Query Context Manager
 """
 
-import sqlite3
+from sqlite_profile import get_profile
 
 
 class ExecuteQuery:
-    """Custom context manager to execute a SQL query and return results"""
+    """Custom context manager to execute a SQL query and return results
 
-    def __init__(self, query, params=None, db_name="users.db"):
+    `profile` names the PRAGMA settings applied on connect (see
+    sqlite_profile.py): SQLite's defaults unless asked for, "fast" for
+    throughput (switches the file to WAL) or "reader" for read-only
+    queries. Pass a long-lived `conn` to reuse its compiled statements
+    across queries; it is left open on exit.
+    """
+
+    def __init__(self, query, params=None, db_name="users.db",
+                 profile="default", conn=None):
         self.db_name = db_name
+        self.profile = get_profile(profile)
         self.query = query
         self.params = params or ()
-        self.conn = None
+        self.conn = conn
+        self.owns_conn = conn is None
         self.results = None
 
     def __enter__(self):
-        self.conn = sqlite3.connect(self.db_name)
+        if self.owns_conn:
+            self.conn = self.profile.connect(self.db_name)
         cursor = self.conn.cursor()
         cursor.execute(self.query, self.params)
         self.results = cursor.fetchall()
         return self.results
 
     def __exit__(self, exc_type, exc_value, traceback):
-        if self.conn:
+        if self.owns_conn and self.conn:
             self.conn.close()
 
 
@@ -32,5 +43,5 @@ class ExecuteQuery:
 if __name__ == "__main__":
     query = "SELECT * FROM users WHERE age > ?"
     params = (25,)
-    with ExecuteQuery(query, params) as results:
+    with ExecuteQuery(query, params, profile="reader") as results:
         print(" Query Results:", results)
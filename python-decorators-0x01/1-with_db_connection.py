@@ -3,21 +3,18 @@
 Task 1: Handle Database Connections with a Decorator
 """
 
-import sqlite3
 import functools
 
+from db_pool import get_pool
+
 
 def with_db_connection(func):
-    """Decorator to handle opening and closing of database connection"""
+    """Decorator to provide a pooled database connection to the function"""
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect("users.db")
-        try:
-            # Pass the connection to the decorated function
-            result = func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-        return result
+        # Borrow a pooled connection and pass it to the decorated function
+        with get_pool().connection() as conn:
+            return func(conn, *args, **kwargs)
     return wrapper
 
 
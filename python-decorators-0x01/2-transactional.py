@@ -3,34 +3,18 @@
 Task 2: Transaction Management Decorator
 """
 
-import sqlite3
 import functools
 
+from db_pool import get_pool
+from transactions import group_commit, transactional
+
 
 def with_db_connection(func):
-    """Decorator to handle opening and closing of database connection"""
+    """Decorator to provide a pooled database connection to the function"""
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect("users.db")
-        try:
-            result = func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-        return result
-    return wrapper
-
-
-def transactional(func):
-    """Decorator to manage transactions (commit/rollback)"""
-    @functools.wraps(func)
-    def wrapper(conn, *args, **kwargs):
-        try:
-            result = func(conn, *args, **kwargs)
-            conn.commit()
-            return result
-        except Exception as e:
-            conn.rollback()
-            raise e
+        with get_pool().connection() as conn:
+            return func(conn, *args, **kwargs)
     return wrapper
 
 
@@ -42,7 +26,24 @@ def update_user_email(conn, user_id, new_email):
     cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
 
 
+@with_db_connection
+@transactional
+def update_user_emails(conn, updates):
+    """Update many emails in one statement batch; updates is an iterable
+    of (user_id, new_email) pairs"""
+    cursor = conn.cursor()
+    cursor.executemany("UPDATE users SET email = ? WHERE id = ?",
+                       ((new_email, user_id) for user_id, new_email in updates))
+
+
 # Example usage
 if __name__ == "__main__":
     update_user_email(user_id=1, new_email="Crawford_Cartwright@hotmail.com")
     print("✅ User email updated successfully!")
+
+    # Many updates: one commit per batch instead of one per call
+    with group_commit(max_calls=500):
+        for user_id in range(1, 11):
+            update_user_email(user_id=user_id,
+                              new_email=f"user{user_id}@example.com")
+    print("✅ Batched email updates committed!")
@@ -3,47 +3,28 @@
 Task 3: Retry Database Queries
 """
 
-import time
-import sqlite3
 import functools
 
+from breaker import circuit_breaker
+from db_pool import get_pool
+from retry import retry_on_failure
+
 
 def with_db_connection(func):
-    """Decorator to handle opening and closing of database connection"""
+    """Decorator to provide a pooled database connection to the function"""
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect("users.db")
-        try:
-            result = func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-        return result
+        with get_pool().connection() as conn:
+            return func(conn, *args, **kwargs)
     return wrapper
 
 
-def retry_on_failure(retries=3, delay=2):
-    """Decorator to retry a function on failure"""
-    def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            last_exception = None
-            for attempt in range(retries):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    last_exception = e
-                    print(f"⚠️ Attempt {attempt + 1} failed: {e}. Retrying in {delay}s...")
-                    time.sleep(delay)
-            # If all retries fail, raise the last exception
-            raise last_exception
-        return wrapper
-    return decorator
-
-
+@circuit_breaker("users.db")
 @with_db_connection
 @retry_on_failure(retries=3, delay=1)
 def fetch_users_with_retry(conn):
-    """Fetch all users from the database, retrying on failure"""
+    """Fetch all users from the database, retrying on failure and failing
+    fast while the database keeps failing"""
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM users")
     return cursor.fetchall()
@@ -3,57 +3,63 @@
 Task 4: Cache Database Queries
 """
 
-import sqlite3
 import functools
 
-
-# Cache storage
-query_cache = {}
+from cache import make_key, query_cache
+from db_pool import get_pool
+from transactions import has_uncommitted_writes
 
 
 def with_db_connection(func):
-    """Decorator to handle opening and closing of database connection"""
+    """Decorator to provide a pooled database connection to the function"""
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect("users.db")
-        try:
-            result = func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-        return result
+        with get_pool().connection() as conn:
+            return func(conn, *args, **kwargs)
     return wrapper
 
 
 def cache_query(func):
-    """Decorator to cache query results based on the query string"""
+    """Decorator to cache query results by database, query and parameters
+
+    Concurrent misses on the same query run it once; the other callers
+    wait for and share that result. On a connection with uncommitted
+    writes the query bypasses the cache, as it may read rows that are
+    never committed.
+    """
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
-        # extract query string (positional or keyword)
-        query = None
-        if args:
-            # If first positional argument after conn is the query
-            query = args[0] if len(args) > 0 else None
-        if "query" in kwargs:
-            query = kwargs["query"]
+        if has_uncommitted_writes(conn):
+            return func(conn, *args, **kwargs)
+        # extract query string and parameters (positional or keyword)
+        query = kwargs.get("query", args[0] if args else None)
+        params = kwargs.get("params", args[1] if len(args) > 1 else ())
+        key = make_key(getattr(conn, "database", None), query, params)
 
-        if query in query_cache:
-            print(f"📦 Returning cached result for query: {query}")
-            return query_cache[query]
+        def refresh():
+            # Background revalidation borrows its own pooled connection
+            with conn.pool.connection() as fresh:
+                return func(fresh, *args, **kwargs)
 
-        # Execute query if not cached
-        result = func(conn, *args, **kwargs)
-        query_cache[query] = result
-        print(f"✅ Cached result for query: {query}")
+        result, source = query_cache.get_or_load(
+            key,
+            lambda: func(conn, *args, **kwargs),
+            refresh=refresh if getattr(conn, "pool", None) else None
+        )
+        if source == "miss":
+            print(f"✅ Cached result for query: {query}")
+        else:
+            print(f"📦 Returning cached result for query: {query}")
         return result
     return wrapper
 
 
 @with_db_connection
 @cache_query
-def fetch_users_with_cache(conn, query):
+def fetch_users_with_cache(conn, query, params=()):
     """Fetch users with caching"""
     cursor = conn.cursor()
-    cursor.execute(query)
+    cursor.execute(query, params)
     return cursor.fetchall()
 
 
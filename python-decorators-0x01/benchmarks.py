@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the python-decorators-0x01 helpers
+
+Each benchmark builds its own temporary users.db, e.g.:
+
+    ./benchmarks.py pool
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import logging
+
+import breaker
+import cache
+import db_pool
+import instrumentation
+import pipeline
+import retry
+import sqlite_profile
+import statement_cache
+
+with_db_connection = __import__('1-with_db_connection')
+transactional = __import__('2-transactional')
+
+
+def make_users_db(path, rows=10000):
+    """Create a users table with `rows` random users at `path`"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, "
+                 "email TEXT, age INTEGER)")
+    rng = random.Random(0)
+    conn.executemany(
+        "INSERT INTO users (name, email, age) VALUES (?, ?, ?)",
+        ((f"user{i}", f"user{i}@example.com", rng.randint(18, 90))
+         for i in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+
+@contextmanager
+def users_db(rows=10000, **pool_options):
+    """Temporary users.db with the shared pool pointed at it"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "users.db")
+        make_users_db(path, rows)
+        db_pool.configure_pool(database=path, **pool_options)
+        try:
+            yield path
+        finally:
+            db_pool.get_pool().close()
+
+
+def _timed(func, *args, **kwargs):
+    """Return (seconds, result) for a single call"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def calls_per_second(func, threads, calls):
+    """Run `calls` calls of func in each of `threads` threads"""
+    def worker():
+        for i in range(calls):
+            func(i)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * calls / (time.perf_counter() - start)
+
+
+def bench_pool(threads=(1, 4, 16), calls=2000):
+    """get_user_by_id calls/sec: connect per call vs the pool"""
+    with users_db(max_size=16) as path:
+        def per_call(user_id):
+            conn = sqlite3.connect(path)
+            try:
+                conn.execute("SELECT * FROM users WHERE id = ?",
+                             (user_id + 1,)).fetchone()
+            finally:
+                conn.close()
+
+        def pooled(user_id):
+            with_db_connection.get_user_by_id(user_id=user_id + 1)
+
+        print(f"{'threads':>8} {'connect/call':>13} {'pooled':>10}")
+        for count in threads:
+            before = calls_per_second(per_call, count, calls)
+            after = calls_per_second(pooled, count, calls)
+            print(f"{count:>8} {before:>13,.0f} {after:>10,.0f}")
+
+
+def bench_cache_backends(lookups=5000, rows=100):
+    """Cache hit latency: in-process dict vs the shared SQLite file"""
+    with users_db() as path:
+        conn = sqlite3.connect(path)
+        result = conn.execute("SELECT * FROM users LIMIT ?",
+                              (rows,)).fetchall()
+        conn.close()
+        backends = [("memory", cache.MemoryBackend())]
+        serializers = ["pickle"] + (["msgpack"] if cache.msgpack else [])
+        for serializer in serializers:
+            backends.append((
+                f"sqlite/{serializer}",
+                cache.SQLiteBackend(os.path.join(os.path.dirname(path),
+                                                 f"cache-{serializer}.db"),
+                                    serializer=serializer)
+            ))
+        print(f"{'backend':>16} {'us/hit':>8}")
+        for label, backend in backends:
+            query_cache = cache.QueryCache(backend=backend)
+            key = cache.make_key(path, "SELECT * FROM users LIMIT ?", (rows,))
+            query_cache.set(key, result)
+            start = time.perf_counter()
+            for _ in range(lookups):
+                found, value = query_cache.get(key)
+            elapsed = time.perf_counter() - start
+            assert found and list(value) == result
+            print(f"{label:>16} {elapsed / lookups * 1e6:>8.1f}")
+
+
+def bench_log_overhead(calls=100000):
+    """Per-call cost of log_queries on a no-op query function"""
+    instrumentation.configure_query_logging(handler=logging.NullHandler())
+
+    def query(sql, params=()):
+        return []
+
+    def print_logged(sql, params=()):
+        # The previous log_queries: timestamp and print on every call
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        print(f"[{timestamp}] Executing SQL Query: {sql}", file=devnull)
+        return query(sql, params)
+
+    devnull = open(os.devnull, "w")
+    variants = (
+        ("undecorated", query, None),
+        ("print (previous)", print_logged, None),
+        ("logging disabled", instrumentation.log_queries(query, stats=False),
+         logging.CRITICAL),
+        ("stats only", instrumentation.log_queries(query), logging.CRITICAL),
+        ("sampled 1%", instrumentation.log_queries(sample_rate=0.01,
+                                                   stats=False)(query),
+         logging.INFO),
+        ("every call", instrumentation.log_queries(query, stats=False),
+         logging.INFO),
+    )
+    print(f"{'variant':>18} {'us/call':>8}")
+    for label, func, level in variants:
+        if level is not None:
+            instrumentation.logger.setLevel(level)
+        start = time.perf_counter()
+        for i in range(calls):
+            func("SELECT * FROM users WHERE id = ?", (i,))
+        elapsed = time.perf_counter() - start
+        print(f"{label:>18} {elapsed / calls * 1e6:>8.2f}")
+    instrumentation.logger.setLevel(logging.INFO)
+    devnull.close()
+
+
+def bench_group_commit(updates=100000):
+    """Email updates: commit per call vs group commit vs executemany"""
+    with users_db(rows=updates):
+        def per_call():
+            for user_id in range(1, updates + 1):
+                transactional.update_user_email(
+                    user_id=user_id, new_email=f"a{user_id}@example.com")
+
+        def grouped():
+            with transactional.group_commit(max_calls=1000, max_delay=0.05):
+                for user_id in range(1, updates + 1):
+                    transactional.update_user_email(
+                        user_id=user_id, new_email=f"b{user_id}@example.com")
+
+        def bulk():
+            transactional.update_user_emails(
+                updates=((user_id, f"c{user_id}@example.com")
+                         for user_id in range(1, updates + 1)))
+
+        print(f"{'mode':>16} {'seconds':>9} {'updates/s':>11}")
+        for label, run in (("commit per call", per_call),
+                           ("group commit", grouped),
+                           ("executemany", bulk)):
+            seconds, _ = _timed(run)
+            print(f"{label:>16} {seconds:>9.2f} {updates / seconds:>11,.0f}")
+
+
+def bench_profiles(writes=2000, reads=50000):
+    """Read and write throughput of each connection profile"""
+    print(f"{'profile':>8} {'writes/s':>10} {'reads/s':>10}")
+    for name, profile in sqlite_profile.PROFILES.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "users.db")
+            make_users_db(path, 10000)
+            if profile.read_only:
+                write_rate = None
+            else:
+                conn = profile.connect(path)
+                start = time.perf_counter()
+                for i in range(writes):
+                    conn.execute("UPDATE users SET email = ? WHERE id = ?",
+                                 (f"p{i}@example.com", i % 10000 + 1))
+                    conn.commit()
+                write_rate = writes / (time.perf_counter() - start)
+                conn.close()
+            conn = profile.connect(path)
+            start = time.perf_counter()
+            for i in range(reads):
+                conn.execute("SELECT * FROM users WHERE id = ?",
+                             (i % 10000 + 1,)).fetchone()
+            read_rate = reads / (time.perf_counter() - start)
+            conn.close()
+        written = f"{write_rate:>10,.0f}" if write_rate else f"{'-':>10}"
+        print(f"{name:>8} {written} {read_rate:>10,.0f}")
+
+
+def bench_statements(calls=50000):
+    """Pooled point lookups with and without the statement cache"""
+    get_user_by_id = with_db_connection.get_user_by_id
+    print(f"{'cached':>8} {'calls/s':>10} {'hit rate':>9}")
+    for size in (0, statement_cache.DEFAULT_SIZE):
+        with users_db(cached_statements=size):
+            get_user_by_id(1)
+            start = time.perf_counter()
+            for i in range(calls):
+                get_user_by_id(i % 10000 + 1)
+            rate = calls / (time.perf_counter() - start)
+            hit_rate = db_pool.get_pool().stats()["statement_hit_rate"]
+        print(f"{size:>8} {rate:>10,.0f} {hit_rate:>9.1%}")
+
+
+def bench_pipeline(calls=50000):
+    """Per-call cost of the query pipeline vs the nested decorator stack"""
+    instrumentation.configure_query_logging(handler=logging.NullHandler())
+    instrumentation.logger.setLevel(logging.WARNING)
+    sql = "SELECT * FROM users WHERE id = ?"
+    with users_db():
+        @instrumentation.log_queries
+        @breaker.circuit_breaker("bench")
+        @with_db_connection.with_db_connection
+        @retry.retry_on_failure(retries=3, delay=1)
+        @transactional.transactional
+        def stacked(conn, query, params=()):
+            return conn.execute(query, params).fetchall()
+
+        piped = pipeline.QueryPipeline(
+            pipeline.MetricsStage(), pipeline.LogStage(),
+            pipeline.BreakerStage("bench"),
+            pipeline.RetryStage(retries=3, delay=1),
+            pipeline.TransactionStage())
+
+        def bare(query, params=()):
+            with db_pool.get_pool().connection() as conn:
+                return conn.execute(query, params).fetchall()
+
+        print(f"{'variant':>12} {'us/call':>8}")
+        for label, func in (("bare", bare), ("decorators", stacked),
+                            ("pipeline", piped)):
+            func(sql, (1,))
+            start = time.perf_counter()
+            for i in range(calls):
+                func(sql, (i % 10000 + 1,))
+            elapsed = time.perf_counter() - start
+            print(f"{label:>12} {elapsed / calls * 1e6:>8.2f}")
+    instrumentation.logger.setLevel(logging.INFO)
+
+
+BENCHMARKS = {
+    "pool": bench_pool,
+    "cache_backends": bench_cache_backends,
+    "log_overhead": bench_log_overhead,
+    "group_commit": bench_group_commit,
+    "profiles": bench_profiles,
+    "statements": bench_statements,
+    "pipeline": bench_pipeline,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"== {name}")
+        BENCHMARKS[name]()
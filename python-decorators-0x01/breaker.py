@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Circuit breaker for database calls
+
+Stack it outside with_db_connection and retry_on_failure so that, while
+the database is down, callers fail immediately instead of each holding a
+connection through a full round of retries:
+
+    @circuit_breaker("users.db")
+    @with_db_connection
+    @retry_on_failure(retries=3, delay=1)
+    def fetch_users(conn): ...
+"""
+
+import functools
+import threading
+import time
+from collections import deque
+
+from retry import is_transient
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling through while a breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Opens when at least `failure_rate` of the last `window` calls (and at
+    least `min_calls` of them) failed, rejects calls for `open_seconds`,
+    then lets up to `half_open_probes` probe calls through: any failing
+    probe re-opens it, that many successes close it again.
+
+    Only errors for which is_failure(error) is true count against the
+    breaker; other exceptions are the caller's problem, not the database's.
+    """
+
+    def __init__(self, name, failure_rate=0.5, window=20, min_calls=10,
+                 open_seconds=30.0, half_open_probes=3,
+                 is_failure=is_transient):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.is_failure = is_failure
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window)  # True for a failed call
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        self.transitions = {}
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def _transition(self, state):
+        key = f"{self.state}->{state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        elif state == HALF_OPEN:
+            self._probes = 0
+            self._probe_successes = 0
+        else:
+            self._outcomes.clear()
+
+    def admit(self):
+        """Admit or reject a call, raising CircuitOpenError when rejected;
+        returns whether it is a probe, to be passed on to record()"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"Circuit '{self.name}' is open")
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    self.rejected += 1
+                    raise CircuitOpenError(
+                        f"Circuit '{self.name}' is half-open")
+                self._probes += 1
+                return True
+            return False
+
+    def record(self, failed, probe):
+        """Record the outcome of a call admitted by admit()"""
+        with self._lock:
+            self.calls += 1
+            self.failures += failed
+            if probe:
+                if self.state != HALF_OPEN:
+                    return
+                if failed:
+                    self._transition(OPEN)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._transition(CLOSED)
+                return
+            if self.state != CLOSED:
+                return
+            self._outcomes.append(failed)
+            if len(self._outcomes) >= self.min_calls and \
+                    sum(self._outcomes) / len(self._outcomes) >= \
+                    self.failure_rate:
+                self._transition(OPEN)
+
+    def release(self, probe):
+        """Give back an admitted call that never reached the database (a
+        cache hit, say) without recording an outcome for it"""
+        with self._lock:
+            if probe and self.state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def call(self, func, *args, **kwargs):
+        """Call func through the breaker"""
+        probe = self.admit()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.record(bool(self.is_failure(e)), probe)
+            raise
+        self.record(False, probe)
+        return result
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+        wrapper.breaker = self
+        return wrapper
+
+    def snapshot(self):
+        """State and counters for monitoring"""
+        with self._lock:
+            recent = len(self._outcomes)
+            return {
+                "name": self.name,
+                "state": self.state,
+                "recent_failure_rate": sum(self._outcomes) / recent
+                if recent else 0.0,
+                "calls": self.calls,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "transitions": dict(self.transitions),
+            }
+
+
+# Breakers by name, so one breaker guards every function using a database
+breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def circuit_breaker(name, **options):
+    """Decorator guarding a function with the named shared CircuitBreaker
+    (created with `options` on first use)"""
+    with _breakers_lock:
+        breaker = breakers.get(name)
+        if breaker is None:
+            breaker = breakers[name] = CircuitBreaker(name, **options)
+    return breaker
+
+
+def breaker_states():
+    """snapshot() of every registered breaker"""
+    with _breakers_lock:
+        return [breaker.snapshot() for breaker in breakers.values()]
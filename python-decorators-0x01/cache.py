@@ -0,0 +1,689 @@
+#!/usr/bin/env python3
+"""
+Bounded query result cache with TTL and table-level invalidation
+
+Results live in a pluggable backend: MemoryBackend (per process, the
+default) or SQLiteBackend (a file shared by every process on the host).
+"""
+
+import functools
+import pickle
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import msgpack
+except ImportError:  # optional, only needed for serializer="msgpack"
+    msgpack = None
+
+# Literals and comments, which may contain anything that looks like SQL
+_NOISE = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.DOTALL)
+# An identifier, optionally quoted and schema-qualified
+_NAME = r'[`"\[]?\w+[`"\]]?(?:\s*\.\s*[`"\[]?\w+[`"\]]?)*'
+_TOKEN = re.compile(_NAME + r'|[(),;]')
+# Tables a statement modifies
+_TABLE_WRITE = re.compile(
+    r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?'
+    r'|DELETE\s+FROM|DROP\s+TABLE(?:\s+IF\s+EXISTS)?|ALTER\s+TABLE)'
+    r'\s+(' + _NAME + ')', re.IGNORECASE)
+# Words that end a list of tables after FROM
+_CLAUSES = frozenset((
+    "WHERE", "GROUP", "ORDER", "LIMIT", "HAVING", "WINDOW", "UNION",
+    "EXCEPT", "INTERSECT", "ON", "USING", "JOIN", "NATURAL", "LEFT", "RIGHT",
+    "INNER", "CROSS", "FULL", "OUTER", "RETURNING", "SET", "VALUES",
+    "SELECT", "DEFAULT",
+))
+_STATEMENTS = frozenset(("SELECT", "INSERT", "REPLACE", "UPDATE", "DELETE"))
+_SPACE = re.compile(r"\s+")
+_QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+
+def _tokens(sql):
+    return _TOKEN.findall(_NOISE.sub(" ", sql))
+
+
+def _table_name(token):
+    """users for users, main.users, "users" or [main].[users]"""
+    return token.rsplit(".", 1)[-1].strip(' `"[]').lower()
+
+
+def _skip_group(tokens, i):
+    """Index just past the parenthesized group opening at tokens[i]"""
+    depth = 0
+    for j in range(i, len(tokens)):
+        if tokens[j] == "(":
+            depth += 1
+        elif tokens[j] == ")":
+            depth -= 1
+            if not depth:
+                return j + 1
+    return len(tokens)
+
+
+def _table_list(tokens, i, tables, many):
+    """Add the tables named from tokens[i] on; `many` reads a comma list"""
+    while i < len(tokens):
+        token = tokens[i]
+        if token == "(":
+            i = _skip_group(tokens, i)  # a subquery, scanned on its own
+        elif token in "),;" or token.upper() in _CLAUSES:
+            return
+        else:
+            tables.add(_table_name(token))
+            i += 1
+        # Skip arguments and alias ([AS] name) up to a comma or clause
+        while i < len(tokens) and tokens[i] not in "),;" and \
+                tokens[i].upper() not in _CLAUSES:
+            i = _skip_group(tokens, i) if tokens[i] == "(" else i + 1
+        if not many or i >= len(tokens) or tokens[i] != ",":
+            return
+        i += 1
+
+
+@functools.lru_cache(maxsize=4096)
+def referenced_tables(sql):
+    """
+    Names (lowercased) of the tables a SQL statement refers to
+
+    Covers comma joins, JOIN, subqueries and schema-qualified names; the
+    names of common table expressions are included too, which at worst
+    makes an invalidation drop a little more than it had to.
+    """
+    tokens = _tokens(sql)
+    tables = set()
+    for i, token in enumerate(tokens):
+        word = token.upper()
+        if word == "FROM":
+            _table_list(tokens, i + 1, tables, True)
+        elif word in ("JOIN", "INTO", "UPDATE", "TABLE"):
+            j = i + 1
+            while j < len(tokens) and tokens[j].upper() in (
+                    "OR", "ROLLBACK", "ABORT", "REPLACE", "FAIL", "IGNORE",
+                    "IF", "NOT", "EXISTS"):
+                j += 1
+            _table_list(tokens, j, tables, False)
+    return frozenset(tables)
+
+
+@functools.lru_cache(maxsize=4096)
+def written_table(sql):
+    """Name (lowercased) of the table a write statement modifies, or None"""
+    statement = _NOISE.sub(" ", sql)
+    if statement.lstrip()[:4].upper() == "WITH":
+        # The statement proper follows the common table expressions
+        tokens = _tokens(statement)
+        depth = 0
+        for i, token in enumerate(tokens):
+            if token == "(":
+                depth += 1
+            elif token == ")":
+                depth -= 1
+            elif not depth and token.upper() in _STATEMENTS:
+                statement = " ".join(tokens[i:])
+                break
+        else:
+            return None
+    match = _TABLE_WRITE.match(statement)
+    return _table_name(match.group(1)) if match else None
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalize(query):
+    """Collapse whitespace outside string literals and quoted names"""
+    parts = _QUOTED.split(query.strip())
+    parts[::2] = [_SPACE.sub(" ", part) for part in parts[::2]]
+    return "".join(parts)
+
+
+def make_key(database, query, params=()):
+    """Cache key covering the database, the query text and its parameters"""
+    if isinstance(params, dict):
+        params = tuple(sorted(params.items()))
+    return (database, _normalize(query), tuple(params or ()))
+
+
+def estimate_size(value):
+    """Approximate memory footprint of a query result in bytes"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        for row in value:
+            size += sys.getsizeof(row)
+            if isinstance(row, tuple):
+                size += sum(sys.getsizeof(field) for field in row)
+    return size
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires", "tables")
+
+    def __init__(self, value, size, expires, tables):
+        self.value = value
+        self.size = size
+        self.expires = expires
+        self.tables = tables
+
+
+class MemoryBackend:
+    """
+    In-process LRU storage bounded by entry count and estimated bytes
+
+    Backends are thread-safe on their own, so QueryCache never holds its
+    lock across storage calls.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._by_table = {}  # (database, table) -> set of keys
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by every invalidation
+        self.bytes = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return (value, expires) and mark the entry recently used, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry.value, entry.expires
+
+    def generation(self):
+        """Counter bumped by every invalidation and clear"""
+        return self._generation
+
+    def set(self, key, value, expires, tables, generation=None):
+        """
+        Store a result; return False, storing nothing, if `generation` is
+        given and an invalidation has happened since it was read
+        """
+        size = estimate_size(value)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            if size > self.max_bytes:
+                return True
+            self._remove(key)
+            self._entries[key] = _Entry(value, size, expires, tables)
+            self.bytes += size
+            for table in tables:
+                self._by_table.setdefault((key[0], table), set()).add(key)
+            while len(self._entries) > self.max_entries or \
+                    self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            return True
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= entry.size
+        for table in entry.tables:
+            keys = self._by_table.get((key[0], table))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[(key[0], table)]
+
+    def invalidate_tables(self, database, tables):
+        """Drop entries that read from `tables`; return how many"""
+        dropped = 0
+        with self._lock:
+            self._generation += 1
+            for table in tables:
+                for key in list(self._by_table.get((database, table), ())):
+                    self._remove(key)
+                    dropped += 1
+        return dropped
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_table.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes,
+                    "evictions": self.evictions}
+
+
+class SQLiteBackend:
+    """
+    LRU storage in a SQLite file shared by every process that opens it
+
+    Values are serialized with pickle protocol 5 (or msgpack, which turns
+    result rows into tuples again on load; a list result stays a list).
+    Values the serializer cannot handle are not cached and are counted in
+    stats()["unserializable"]. Table invalidations are written to the same
+    file, so a commit in one worker drops the entry for all, and bump a
+    generation stored next to the entries: a load that another process's
+    invalidation overtook is refused by set() instead of caching old rows.
+    Entry count and bytes are kept up to date by triggers, so a set()
+    evicts without scanning the table.
+    """
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS cache_entries ("
+        " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+        " expires REAL NOT NULL, accessed REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS cache_entries_accessed"
+        " ON cache_entries (accessed)",
+        "CREATE TABLE IF NOT EXISTS cache_tables ("
+        " database TEXT, tbl TEXT, key TEXT,"
+        " PRIMARY KEY (database, tbl, key)) WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS cache_tables_key ON cache_tables (key)",
+        "CREATE TABLE IF NOT EXISTS cache_state ("
+        " id INTEGER PRIMARY KEY CHECK (id = 1), entries INTEGER NOT NULL,"
+        " bytes INTEGER NOT NULL, generation INTEGER NOT NULL)",
+        # Totals of a file written before cache_state existed
+        "INSERT OR IGNORE INTO cache_state"
+        " SELECT 1, COUNT(*), COALESCE(SUM(size), 0), 0 FROM cache_entries",
+        "CREATE TRIGGER IF NOT EXISTS cache_entries_added"
+        " AFTER INSERT ON cache_entries BEGIN"
+        " UPDATE cache_state SET entries = entries + 1,"
+        " bytes = bytes + NEW.size; END",
+        "CREATE TRIGGER IF NOT EXISTS cache_entries_removed"
+        " AFTER DELETE ON cache_entries BEGIN"
+        " UPDATE cache_state SET entries = entries - 1,"
+        " bytes = bytes - OLD.size; END",
+    )
+
+    def __init__(self, path="query_cache.db", max_entries=100000,
+                 max_bytes=256 * 1024 * 1024, serializer="pickle",
+                 touch_interval=1.0):
+        if serializer == "msgpack" and msgpack is None:
+            raise ImportError("serializer='msgpack' requires msgpack: "
+                              "pip install msgpack")
+        if serializer not in ("pickle", "msgpack"):
+            raise ValueError(f"Unknown serializer: {serializer!r}")
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.serializer = serializer
+        self.touch_interval = touch_interval
+        self.evictions = 0
+        self.unserializable = 0
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for statement in self._SCHEMA:
+                conn.execute(statement)
+
+    def _conn(self):
+        """This thread's connection to the cache file"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _dumps(self, value):
+        if self.serializer == "msgpack":
+            # msgpack has one array type; remember whether the result was a
+            # list (fetchall) or a tuple (a fetchone row)
+            return msgpack.packb((isinstance(value, list), value))
+        return pickle.dumps(value, protocol=5)
+
+    def _loads(self, blob):
+        if self.serializer == "msgpack":
+            was_list, value = msgpack.unpackb(blob, use_list=False)
+            return list(value) if was_list else value
+        return pickle.loads(blob)
+
+    def get(self, key):
+        """Return (value, expires) and mark the entry recently used, or None"""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, expires, accessed FROM cache_entries WHERE key = ?",
+            (repr(key),)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[2] > self.touch_interval:
+            # Recency only needs to be roughly right for LRU; skipping most
+            # updates keeps hits read-only and avoids write-lock contention
+            with conn:
+                conn.execute(
+                    "UPDATE cache_entries SET accessed = ? WHERE key = ?",
+                    (now, repr(key))
+                )
+        return self._loads(row[0]), row[1]
+
+    def generation(self):
+        """Counter bumped by every invalidation and clear, in any process"""
+        return self._conn().execute(
+            "SELECT generation FROM cache_state").fetchone()[0]
+
+    def set(self, key, value, expires, tables, generation=None):
+        """
+        Store a result; return False, storing nothing, if `generation` is
+        given and an invalidation has happened since it was read
+        """
+        try:
+            blob = self._dumps(value)
+        except (pickle.PicklingError, TypeError, ValueError, AttributeError,
+                OverflowError):
+            # e.g. Decimal under msgpack: serve the result uncached
+            self.unserializable += 1
+            return True
+        if len(blob) > self.max_bytes:
+            return True
+        name = repr(key)
+        conn = self._conn()
+        with conn:
+            # Take the write lock first, so no invalidation can land
+            # between the generation check and the insert
+            conn.execute("BEGIN IMMEDIATE")
+            if generation is not None and generation != conn.execute(
+                    "SELECT generation FROM cache_state").fetchone()[0]:
+                return False
+            # DELETE then INSERT rather than INSERT OR REPLACE, whose
+            # implicit delete does not fire the cache_state trigger
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (name,))
+            conn.execute(
+                "INSERT INTO cache_entries "
+                "(key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (name, blob, len(blob), expires, time.time())
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO cache_tables VALUES (?, ?, ?)",
+                [(key[0], table, name) for table in tables]
+            )
+            self._evict(conn)
+        return True
+
+    def _evict(self, conn):
+        """Drop least recently used entries until within both bounds"""
+        count, size = conn.execute(
+            "SELECT entries, bytes FROM cache_state").fetchone()
+        victims = []
+        while count > self.max_entries or size > self.max_bytes:
+            # Enough for the count bound; the byte bound may need another
+            batch = conn.execute(
+                "SELECT key, size FROM cache_entries ORDER BY accessed "
+                "LIMIT ? OFFSET ?",
+                (max(count - self.max_entries, 0) + 16, len(victims))
+            ).fetchall()
+            if not batch:
+                break
+            for name, entry_size in batch:
+                if count <= self.max_entries and size <= self.max_bytes:
+                    break
+                victims.append((name,))
+                count -= 1
+                size -= entry_size
+        self._delete(conn, victims)
+        self.evictions += len(victims)
+
+    def _delete(self, conn, names):
+        conn.executemany("DELETE FROM cache_entries WHERE key = ?", names)
+        conn.executemany("DELETE FROM cache_tables WHERE key = ?", names)
+
+    def remove(self, key):
+        conn = self._conn()
+        with conn:
+            self._delete(conn, [(repr(key),)])
+
+    def invalidate_tables(self, database, tables):
+        """Drop entries that read from `tables`; return how many"""
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "UPDATE cache_state SET generation = generation + 1")
+            names = set()
+            for table in tables:
+                names.update(conn.execute(
+                    "SELECT key FROM cache_tables WHERE database IS ? "
+                    "AND tbl = ?", (database, table)
+                ).fetchall())
+            self._delete(conn, list(names))
+        return len(names)
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "UPDATE cache_state SET generation = generation + 1")
+            conn.execute("DELETE FROM cache_entries")
+            conn.execute("DELETE FROM cache_tables")
+
+    def stats(self):
+        count, size = self._conn().execute(
+            "SELECT entries, bytes FROM cache_state").fetchone()
+        return {"entries": count, "bytes": size, "evictions": self.evictions,
+                "unserializable": self.unserializable}
+
+
+class _Flight:
+    """A load in progress that concurrent misses for the same key wait on
+
+    `generation` is the backend's invalidation generation when the load
+    started; a result loaded across an invalidation is returned but not
+    stored.
+    """
+    __slots__ = ("done", "value", "error", "generation")
+
+    def __init__(self, generation):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.generation = generation
+
+
+class QueryCache:
+    """
+    Thread-safe cache of query results over a storage backend
+
+    Entries expire after ttl seconds, and are dropped when a write to one
+    of the tables their query read from is committed; the backend bounds
+    its size (LRU by default, see MemoryBackend).
+
+    get_or_load() runs a single load per key however many threads miss on
+    it at once, and with stale_ttl > 0 keeps serving an expired entry for
+    that long while one background refresh replaces it. Loads are
+    coalesced within a process; a shared backend only shares the results.
+    The lock only guards counters and loads in flight: storage calls run
+    outside it, so a slow SQLiteBackend write does not stall every hit.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024,
+                 ttl=300.0, stale_ttl=0.0, backend=None):
+        self.backend = backend or MemoryBackend(max_entries, max_bytes)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._inflight = {}  # key -> _Flight
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.discarded_loads = 0
+        self.refresh_failures = 0
+
+    def _lookup(self, key, now):
+        """Return (value, found, fresh); drops entries past their stale window"""
+        entry = self.backend.get(key)
+        if entry is None:
+            return None, False, False
+        value, expires = entry
+        if expires >= now:
+            return value, True, True
+        if expires + self.stale_ttl >= now:
+            return value, True, False
+        self.backend.remove(key)
+        with self._lock:
+            self.expirations += 1
+        return None, False, False
+
+    def generation(self):
+        """The backend's invalidation generation, to pass to set() for a
+        result read after this call"""
+        return self.backend.generation()
+
+    def get(self, key):
+        """Return (True, value) on a fresh hit, else (False, None)"""
+        value, _, fresh = self._lookup(key, time.time())
+        with self._lock:
+            if not fresh:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+        return True, value
+
+    def get_or_load(self, key, loader, tables=None, refresh=None):
+        """
+        Return (value, source) for key, calling loader() at most once for
+        all concurrent misses on it
+
+        source is "hit", "stale", "coalesced" (waited on another thread's
+        load) or "miss" (this call ran the loader). An expired entry within
+        stale_ttl is served as "stale" while refresh() -- which must not
+        depend on the caller's connection -- reloads it on a background
+        thread; without refresh, stale entries are treated as misses.
+        """
+        value, found, fresh = self._lookup(key, time.time())
+        if found and fresh:
+            with self._lock:
+                self.hits += 1
+            return value, "hit"
+        # Read before any load starts, so an invalidation after this point
+        # keeps that load's result out of the cache
+        generation = self.backend.generation()
+        with self._lock:
+            if found and refresh is not None:
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    flight = self._inflight[key] = _Flight(generation)
+                    threading.Thread(
+                        target=self._refresh,
+                        args=(key, refresh, tables, flight), daemon=True
+                    ).start()
+                return value, "stale"
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._inflight[key] = _Flight(generation)
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, "coalesced"
+        return self._load(key, loader, tables, flight), "miss"
+
+    def _load(self, key, loader, tables, flight):
+        """Run a load for a registered flight and publish its outcome"""
+        try:
+            flight.value = loader()
+            if tables is None:
+                tables = referenced_tables(key[1])
+            # An invalidation since the load began may have made it stale
+            if not self.backend.set(key, flight.value, time.time() + self.ttl,
+                                    tables, flight.generation):
+                with self._lock:
+                    self.discarded_loads += 1
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+            flight.done.set()
+
+    def _refresh(self, key, refresh, tables, flight):
+        """Background stale-while-revalidate load; a failure is counted and
+        the stale entry kept until it leaves its stale window"""
+        try:
+            self._load(key, refresh, tables, flight)
+        except Exception:
+            with self._lock:
+                self.refresh_failures += 1
+
+    def set(self, key, value, tables=None, generation=None):
+        """
+        Store a result; `tables` defaults to those named in the query. Pass
+        the generation() read before the query ran to drop a result that
+        an invalidation overtook.
+        """
+        if tables is None:
+            tables = referenced_tables(key[1])
+        if not self.backend.set(key, value, time.time() + self.ttl, tables,
+                                generation):
+            with self._lock:
+                self.discarded_loads += 1
+
+    def invalidate_tables(self, database, tables):
+        """Drop every cached result that read from one of `tables`"""
+        # Loads in flight may have read the old rows: have new misses start
+        # fresh loads, and the backend's new generation keep the old ones
+        # unstored when they finish
+        with self._lock:
+            self._inflight.clear()
+        dropped = self.backend.invalidate_tables(database, tables)
+        with self._lock:
+            self.invalidations += dropped
+
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._inflight.clear()
+        self.backend.clear()
+
+    def stats(self):
+        """Hit/miss/eviction counters and current size"""
+        stats = self.backend.stats()
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.coalesced + \
+                self.misses
+            stats.update({
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.stale_hits) / lookups
+                if lookups else 0.0,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "discarded_loads": self.discarded_loads,
+                "refresh_failures": self.refresh_failures,
+            })
+            return stats
+
+
+def configure_cache(**options):
+    """Replace the shared cache's settings in place, e.g.
+    configure_cache(backend=SQLiteBackend("/run/app/query_cache.db"))"""
+    replacement = QueryCache(**options)
+    with query_cache._lock:
+        for name, value in vars(replacement).items():
+            if name != "_lock":
+                setattr(query_cache, name, value)
+    return query_cache
+
+
+# Shared by cache_query and the transactional decorator
+query_cache = QueryCache()
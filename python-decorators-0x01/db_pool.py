@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Thread-safe SQLite connection pool shared by the with_db_connection decorators
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from instrumentation import record_statement
+from sqlite_profile import get_profile
+from statement_cache import (StatementCachingConnection,
+                             StatementCachingCursor, statement_stats)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available in time"""
+
+
+def _run_recorded(conn, execute, sql, *args):
+    """Run execute(sql, *args), timing it into query_stats when the
+    connection's pool records statistics"""
+    pool = conn.pool
+    if pool is None or not pool.record_stats:
+        return execute(sql, *args)
+    start = time.perf_counter()
+    error = True
+    try:
+        result = execute(sql, *args)
+        error = False
+        return result
+    finally:
+        record_statement(sql, (time.perf_counter() - start) * 1000, error)
+
+
+class PooledCursor(StatementCachingCursor):
+    """Cursor whose statements are recorded in query_stats"""
+
+    def execute(self, sql, parameters=()):
+        return _run_recorded(self.connection, super().execute, sql,
+                             parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return _run_recorded(self.connection, super().executemany, sql,
+                             seq_of_parameters)
+
+
+class PooledConnection(StatementCachingConnection):
+    """sqlite3 connection that remembers its database file and pool"""
+
+    database = None
+    pool = None
+
+    def cursor(self, factory=PooledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return _run_recorded(self, super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return _run_recorded(self, super().executemany, sql,
+                             seq_of_parameters)
+
+
+class ConnectionPool:
+    """
+    Pool of reusable SQLite connections
+
+    Connections are created lazily up to max_size (min_size are opened up
+    front), replaced once older than max_lifetime seconds, and checked with
+    a cheap query before being handed out when health_check is on. With
+    thread_affinity each thread gets back the connection it released last,
+    keeping SQLite's per-connection page and statement caches warm for it.
+    Every new connection gets `profile` (a name from
+    sqlite_profile.PROFILES or a ConnectionProfile) applied;
+    cached_statements overrides the profile's statement cache size. With
+    record_stats every statement run on a pooled connection is aggregated
+    into instrumentation.query_stats.
+    """
+
+    def __init__(self, database="users.db", min_size=1, max_size=8,
+                 max_lifetime=300.0, health_check=True,
+                 thread_affinity=True, timeout=5.0, profile="fast",
+                 cached_statements=None, record_stats=True):
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError("need 0 <= min_size <= max_size and max_size >= 1")
+        self.database = database
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.health_check = health_check
+        self.thread_affinity = thread_affinity
+        self.timeout = timeout
+        self.profile = get_profile(profile)
+        self.cached_statements = cached_statements
+        self.record_stats = record_stats
+        self._lock = threading.Condition()
+        self._idle = []  # shared idle connections
+        self._affine = {}  # thread ident -> (thread, idle connection)
+        self._created_at = {}  # connection -> creation time
+        self._opening = 0  # slots reserved by connects in progress
+        self._pinned = threading.local()
+        self._closed = False
+        self.created = 0
+        self.reused = 0
+        for _ in range(min_size):
+            conn = self._connect()
+            self._created_at[conn] = time.monotonic()
+            self.created += 1
+            self._idle.append(conn)
+
+    def _connect(self):
+        """Open and set up a new connection; called without the lock held"""
+        options = {"check_same_thread": False, "factory": PooledConnection}
+        if self.cached_statements is not None:
+            options["cached_statements"] = self.cached_statements
+        conn = self.profile.connect(self.database, **options)
+        conn.database = self.database
+        conn.pool = self
+        return conn
+
+    def _open_reserved(self):
+        """Connect into a slot reserved by _reserve"""
+        try:
+            conn = self._connect()
+        except BaseException:
+            with self._lock:
+                self._opening -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._opening -= 1
+            self._created_at[conn] = time.monotonic()
+            self.created += 1
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created_at.pop(conn, None)
+            self._lock.notify()
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _usable(self, conn):
+        """Whether an idle connection may be handed out again"""
+        created_at = self._created_at.get(conn)
+        if created_at is None:
+            return False
+        age = time.monotonic() - created_at
+        if self.max_lifetime is not None and age > self.max_lifetime:
+            return False
+        if self.health_check:
+            try:
+                # Straight to sqlite3, so the pool's own probe stays out of
+                # the statement cache statistics
+                sqlite3.Connection.execute(conn, "SELECT 1")
+            except sqlite3.Error:
+                return False
+        return True
+
+    def _take_idle(self, steal):
+        """Pop an idle connection, preferring this thread's own
+
+        With `steal`, fall back to connections parked by other threads
+        (dead ones first) rather than waiting for one to be released.
+        """
+        if self.thread_affinity:
+            entry = self._affine.pop(threading.get_ident(), None)
+            if entry is not None:
+                return entry[1]
+        if self._idle:
+            return self._idle.pop()
+        if steal and self._affine:
+            parked = sorted(self._affine.items(),
+                            key=lambda item: item[1][0].is_alive())
+            ident, (_, conn) = parked[0]
+            del self._affine[ident]
+            return conn
+        return None
+
+    def _reserve(self, deadline):
+        """Under the lock: pop an idle connection, or return None having
+        reserved a slot for a new one, waiting until `deadline`"""
+        while True:
+            if self._closed:
+                raise RuntimeError("Connection pool is closed")
+            full = len(self._created_at) + self._opening >= self.max_size
+            conn = self._take_idle(steal=full)
+            if conn is not None:
+                return conn
+            if not full:
+                self._opening += 1
+                return None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise PoolTimeout(
+                    f"No connection available after {self.timeout}s")
+            self._lock.wait(remaining)
+
+    def acquire(self):
+        """Check out a connection, waiting up to `timeout` seconds
+
+        Only the bookkeeping happens under the pool lock: connecting (with
+        its profile PRAGMAs) and health checks run outside it, so a slow
+        or locked database never holds up other threads' acquire/release.
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._lock:
+                conn = self._reserve(deadline)
+            if conn is None:
+                return self._open_reserved()
+            if self._usable(conn):
+                with self._lock:
+                    self.reused += 1
+                return conn
+            self._discard(conn)
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back any open transaction"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if self._closed:
+                self._discard(conn)
+                return
+            ident = threading.get_ident()
+            if self.thread_affinity and ident not in self._affine:
+                self._affine[ident] = (threading.current_thread(), conn)
+            else:
+                self._idle.append(conn)
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and back in
+
+        While the calling thread has pinned a connection (see pin), that
+        connection is handed out instead and stays checked out.
+        """
+        pinned = self.pinned()
+        if pinned is not None:
+            yield pinned
+            return
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def pin(self, conn):
+        """Make connection() hand this thread `conn` until unpin()"""
+        self._pinned.conn = conn
+
+    def unpin(self):
+        self._pinned.conn = None
+
+    def pinned(self):
+        """The connection this thread has pinned, or None"""
+        return getattr(self._pinned, "conn", None)
+
+    def close(self):
+        """Close every idle connection; busy ones are closed on release"""
+        with self._lock:
+            self._closed = True
+            for conn in self._idle:
+                self._discard(conn)
+            for _, conn in self._affine.values():
+                self._discard(conn)
+            self._idle.clear()
+            self._affine.clear()
+            self._lock.notify_all()
+
+    def stats(self):
+        """Counters for monitoring the pool"""
+        with self._lock:
+            statements = statement_stats(list(self._created_at))
+            return {
+                "open": len(self._created_at),
+                "opening": self._opening,
+                "idle": len(self._idle) + len(self._affine),
+                "created": self.created,
+                "reused": self.reused,
+                "statement_hits": statements["hits"],
+                "statement_misses": statements["misses"],
+                "statement_hit_rate": statements["hit_rate"],
+            }
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def configure_pool(**options):
+    """Replace the shared pool, e.g. configure_pool(database="test.db", max_size=4)"""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is not None:
+            _default_pool.close()
+        _default_pool = ConnectionPool(**options)
+        return _default_pool
+
+
+def get_pool():
+    """Return the shared pool, creating it for users.db on first use"""
+    global _default_pool
+    if _default_pool is None:
+        with _default_lock:
+            if _default_pool is None:
+                _default_pool = ConnectionPool()
+    return _default_pool
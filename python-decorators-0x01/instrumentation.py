@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Structured, low-overhead query logging
+
+The decorated call only pays for timing and enqueueing a tuple; building
+the log record, formatting and I/O happen on a listener thread.
+
+Every call is also aggregated per query fingerprint (SQL with literals
+stripped) into `query_stats`: call counts, latency percentiles from a
+log-linear histogram, and rows returned. Statements run on pooled
+connections are recorded too (see record_statement), so helpers that are
+not decorated with log_queries still show up.
+"""
+
+import atexit
+import functools
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+
+logger = logging.getLogger("queries")
+if logger.level == logging.NOTSET:
+    # Record INFO queries by default; a level set by the application wins
+    logger.setLevel(logging.INFO)
+_records = None
+_listener = None
+_listener_lock = threading.Lock()
+
+
+class _QueryListener(logging.handlers.QueueListener):
+    """QueueListener turning queued query tuples into LogRecords
+
+    Callers only enqueue a tuple; building the LogRecord, fingerprinting
+    the parameters and formatting all happen on the listener thread.
+    """
+
+    def prepare(self, item):
+        created, level, filename, lineno, payload = item
+        payload["params"] = params_fingerprint(payload["params"])
+        record = logger.makeRecord(logger.name, level, filename, lineno,
+                                   "query", (), None,
+                                   extra={"query_record": payload})
+        record.created = created
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Format query records as one JSON object per line"""
+
+    def format(self, record):
+        entry = {"ts": round(record.created, 6), "level": record.levelname}
+        entry.update(getattr(record, "query_record", {"message":
+                                                      record.getMessage()}))
+        return json.dumps(entry, default=str)
+
+
+def configure_query_logging(handler=None, level=None):
+    """
+    Route query records through a queue to `handler` (JSON lines on stderr
+    by default) on a background listener thread. Replaces any previous
+    configuration; the `queries` logger's level decides what is recorded,
+    and is only changed when `level` is given. Without a call, the first
+    query record starts the default configuration.
+    """
+    with _listener_lock:
+        return _start_listener(handler, level)
+
+
+def _start_listener(handler, level):
+    global _records, _listener
+    if _listener is not None:
+        _listener.stop()
+    if handler is None:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter())
+    if level is not None:
+        logger.setLevel(level)
+    _records = queue.SimpleQueue()
+    _listener = _QueryListener(_records, handler)
+    _listener.start()
+    return _listener
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+atexit.register(_stop_listener)
+
+
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.IGNORECASE)
+_NAMED_PARAM = re.compile(r"(?<![\w?])[:@$]\w+")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """
+    Normalize SQL so queries differing only in literals group together:
+    comments dropped, string/number literals and named parameters become
+    ?, lists of placeholders become (...), whitespace and case folded
+    """
+    sql = _COMMENT.sub(" ", sql)
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _NAMED_PARAM.sub("?", sql)
+    sql = _VALUE_LIST.sub("(...)", sql)
+    return _SPACE.sub(" ", sql).strip().lower()
+
+
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram of durations in microseconds
+
+    Values keep 5 significant bits (32 sub-buckets per power of two), so
+    any reported percentile is within ~3% of the true value while memory
+    stays bounded by the range of values, not their number.
+    """
+
+    SUB_BUCKETS = 32
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+
+    def _index(self, value):
+        if value < 2 * self.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - 6
+        return shift * self.SUB_BUCKETS + (value >> shift)
+
+    def _midpoint(self, index):
+        if index < 2 * self.SUB_BUCKETS:
+            return float(index)
+        shift = index // self.SUB_BUCKETS - 1
+        lower = (index - shift * self.SUB_BUCKETS) << shift
+        return lower + (1 << shift) / 2
+
+    def record(self, microseconds):
+        index = self._index(max(int(microseconds), 0))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+
+    def percentile(self, p):
+        """Approximate p-th percentile (0-100) in microseconds, or None"""
+        if not self.total:
+            return None
+        rank = p / 100 * self.total
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return self._midpoint(index)
+        return self._midpoint(max(self.counts))
+
+
+class _FingerprintStats:
+    __slots__ = ("example", "calls", "errors", "rows", "total_ms",
+                 "min_ms", "max_ms", "histogram")
+
+    def __init__(self, example):
+        self.example = example
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = None
+        self.histogram = LatencyHistogram()
+
+
+class QueryStats:
+    """
+    In-process per-fingerprint query statistics, in the spirit of
+    pg_stat_statements
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql, duration_ms, rows=None, error=False):
+        """Fold one execution of `sql` into its fingerprint's statistics"""
+        key = fingerprint(sql)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _FingerprintStats(sql)
+            entry.calls += 1
+            entry.errors += bool(error)
+            entry.rows += rows or 0
+            entry.total_ms += duration_ms
+            if entry.min_ms is None or duration_ms < entry.min_ms:
+                entry.min_ms = duration_ms
+            if entry.max_ms is None or duration_ms > entry.max_ms:
+                entry.max_ms = duration_ms
+            entry.histogram.record(duration_ms * 1000)
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self, sort="total_ms"):
+        """List of per-fingerprint statistics, largest `sort` value first"""
+        with self._lock:
+            rows = []
+            for key, entry in self._entries.items():
+                percentiles = {
+                    f"p{p}_ms": round(entry.histogram.percentile(p) / 1000, 3)
+                    for p in (50, 95, 99)
+                }
+                rows.append({
+                    "fingerprint": key,
+                    "example": entry.example,
+                    "calls": entry.calls,
+                    "errors": entry.errors,
+                    "rows": entry.rows,
+                    "total_ms": round(entry.total_ms, 3),
+                    "mean_ms": round(entry.total_ms / entry.calls, 3),
+                    "min_ms": round(entry.min_ms, 3),
+                    "max_ms": round(entry.max_ms, 3),
+                    **percentiles,
+                })
+        return sorted(rows, key=lambda row: row[sort], reverse=True)
+
+    def dump_json(self, sort="total_ms"):
+        return json.dumps(self.snapshot(sort), indent=2)
+
+    def dump_table(self, sort="total_ms", limit=20, width=60):
+        """Fixed-width text table of the top `limit` fingerprints"""
+        columns = ("calls", "total_ms", "mean_ms", "p50_ms", "p95_ms",
+                   "p99_ms", "rows")
+        lines = [" ".join(f"{name:>10}" for name in columns) +
+                 "  fingerprint"]
+        for row in self.snapshot(sort)[:limit]:
+            lines.append(" ".join(f"{row[name]:>10}" for name in columns) +
+                         "  " + row["fingerprint"][:width])
+        return "\n".join(lines)
+
+
+query_stats = QueryStats()
+
+# How many log_queries calls (or pipeline metrics stages) on this thread are
+# recording the current query themselves, with its row count
+_recording = threading.local()
+
+
+def begin_recording():
+    _recording.depth = getattr(_recording, "depth", 0) + 1
+
+
+def end_recording():
+    _recording.depth -= 1
+
+
+def record_statement(sql, duration_ms, error=False):
+    """
+    Fold one statement run on a pooled connection into query_stats, unless
+    an enclosing log_queries call on this thread is already recording it
+
+    The duration covers executing the statement, not fetching its rows.
+    """
+    if not getattr(_recording, "depth", 0):
+        query_stats.record(sql, duration_ms, None, error)
+
+
+def params_fingerprint(params):
+    """Short stable hash of bound parameters (values are not logged)"""
+    if not params:
+        return None
+    return f"{zlib.crc32(repr(params).encode()):08x}"
+
+
+def emit_query_record(level, caller, payload):
+    """
+    Queue a query record for the listener thread; `caller` is the frame
+    the query was issued from and `payload` the record's fields (params
+    are fingerprinted on the listener thread)
+    """
+    if _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                _start_listener(None, None)
+    payload["caller"] = f"{caller.f_code.co_filename}:{caller.f_lineno}"
+    _records.put((time.time(), level, caller.f_code.co_filename,
+                  caller.f_lineno, payload))
+
+
+def log_queries(func=None, *, sample_rate=1.0, slow_ms=None, stats=True):
+    """
+    Decorator recording each query's text, parameter fingerprint, duration,
+    row count and caller as a structured log record
+
+    Usable bare (@log_queries) or configured (@log_queries(sample_rate=0.1,
+    slow_ms=50)): only `sample_rate` of calls are logged, except queries
+    taking at least `slow_ms` milliseconds, which are always logged at
+    WARNING. Unless stats=False, every call is also aggregated into
+    query_stats regardless of sampling. The decorated function takes the
+    query first and optionally its parameters second (or as params=...).
+    """
+    if func is None:
+        return functools.partial(log_queries, sample_rate=sample_rate,
+                                 slow_ms=slow_ms, stats=stats)
+
+    @functools.wraps(func)
+    def wrapper(query, *args, **kwargs):
+        if not stats and not logger.isEnabledFor(logging.WARNING):
+            return func(query, *args, **kwargs)
+        if stats:
+            begin_recording()
+        start = time.perf_counter()
+        error = None
+        result = None
+        try:
+            result = func(query, *args, **kwargs)
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if stats:
+                end_recording()
+            duration_ms = (time.perf_counter() - start) * 1000
+            rows = len(result) if isinstance(result, list) else None
+            if stats:
+                query_stats.record(query, duration_ms, rows, error is not None)
+            slow = slow_ms is not None and duration_ms >= slow_ms
+            level = logging.WARNING if slow or error else logging.INFO
+            if (level == logging.WARNING or sample_rate >= 1.0 or
+                    random.random() < sample_rate) and \
+                    logger.isEnabledFor(level):
+                emit_query_record(level, sys._getframe(1), {
+                    "query": query,
+                    "params": kwargs.get("params",
+                                         args[0] if args else None),
+                    "duration_ms": round(duration_ms, 3),
+                    "rows": rows,
+                    "function": func.__qualname__,
+                    "slow": slow,
+                    "error": repr(error) if error else None,
+                })
+    return wrapper
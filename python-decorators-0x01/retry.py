@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Retry decorators with exponential backoff, full jitter and a retry budget
+"""
+
+import asyncio
+import functools
+import random
+import sqlite3
+import threading
+import time
+
+# MySQL error numbers worth retrying: lock wait timeout, deadlock, can't
+# connect (socket, TCP), server has gone away, lost connection during
+# query, lost connection at handshake. The connect errors are what a
+# circuit breaker sees while the server is down.
+MYSQL_TRANSIENT_ERRNOS = frozenset((1205, 1213, 2002, 2003, 2006, 2013,
+                                    2055))
+
+_TRANSIENT_SQLITE_MESSAGES = ("database is locked", "database table is locked",
+                              "database is busy")
+
+
+def is_transient(error):
+    """Whether an exception is worth retrying (lock contention, dropped
+    connections) rather than a programming or data error"""
+    if isinstance(error, sqlite3.OperationalError):
+        message = str(error).lower()
+        return any(text in message for text in _TRANSIENT_SQLITE_MESSAGES)
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return getattr(error, "errno", None) in MYSQL_TRANSIENT_ERRNOS
+
+
+class RetryBudget:
+    """
+    Token bucket capping retries to a fraction of calls
+
+    Every call deposits `ratio` tokens (up to max_tokens) and every retry
+    spends one, so when a dependency is failing for everyone retries stop
+    after roughly `ratio` extra load instead of multiplying it.
+    """
+
+    def __init__(self, ratio=0.2, max_tokens=10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+        self.denied = 0
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        """Spend a token for one retry; False when the budget is exhausted"""
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            self.denied += 1
+            return False
+
+
+# Shared by every retry_on_failure that does not bring its own budget
+default_budget = RetryBudget()
+
+
+def _backoff(attempt, delay, max_delay):
+    """Full-jitter backoff: uniform in [0, min(max_delay, delay * 2^attempt)]"""
+    return random.uniform(0, min(max_delay, delay * (2 ** attempt)))
+
+
+def next_delay(error, attempt, retries, delay, max_delay, deadline_at,
+               retry_on, budget):
+    """
+    Seconds to wait before retrying after `error` on attempt `attempt`
+    (0-based), or None to give up; shared by the retry decorators and the
+    query pipeline's RetryStage
+    """
+    if attempt + 1 >= retries or not retry_on(error):
+        return None
+    wait = _backoff(attempt, delay, max_delay)
+    if deadline_at is not None and time.monotonic() + wait >= deadline_at:
+        return None
+    if budget and not budget.withdraw():
+        return None
+    print(f"⚠️ Attempt {attempt + 1} failed: {error}. "
+          f"Retrying in {wait:.2f}s...")
+    return wait
+
+
+def retry_on_failure(retries=3, delay=2, max_delay=30.0, deadline=None,
+                     retry_on=is_transient, budget=None):
+    """Decorator to retry a function on transient failures
+
+    Waits a random time up to delay * 2**attempt (capped at max_delay)
+    between attempts, gives up once `deadline` seconds have passed since
+    the first attempt, and only retries errors for which retry_on(error)
+    is true. Retries draw from `budget` (default_budget if None; pass
+    False to disable), shared across calls to avoid retry storms.
+    """
+    if budget is None:
+        budget = default_budget
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            deadline_at = time.monotonic() + deadline if deadline else None
+            if budget:
+                budget.deposit()
+            attempt = 0
+            while True:
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    wait = next_delay(e, attempt, retries, delay, max_delay,
+                                      deadline_at, retry_on, budget)
+                    if wait is None:
+                        raise
+                    time.sleep(wait)
+                    attempt += 1
+        return wrapper
+    return decorator
+
+
+def async_retry_on_failure(retries=3, delay=2, max_delay=30.0, deadline=None,
+                           retry_on=is_transient, budget=None):
+    """Async counterpart of retry_on_failure for coroutine functions;
+    awaits between attempts instead of blocking the thread"""
+    if budget is None:
+        budget = default_budget
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            deadline_at = time.monotonic() + deadline if deadline else None
+            if budget:
+                budget.deposit()
+            attempt = 0
+            while True:
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    wait = next_delay(e, attempt, retries, delay, max_delay,
+                                      deadline_at, retry_on, budget)
+                    if wait is None:
+                        raise
+                    await asyncio.sleep(wait)
+                    attempt += 1
+        return wrapper
+    return decorator
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Per-connection prepared statement cache with hit-rate statistics
+
+sqlite3 already keeps compiled statements in a per-connection LRU keyed by
+SQL text (sized by connect(cached_statements=...)) but exposes neither the
+statements nor any counters. StatementCachingConnection sizes that cache
+and mirrors its LRU bookkeeping, so callers can see how often a query
+skipped compilation.
+"""
+
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+
+DEFAULT_SIZE = 256
+
+
+class StatementCache:
+    """LRU of SQL strings mirroring a connection's compiled statements"""
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self._statements = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, sql):
+        """Record one execution of `sql`; True when it was already compiled"""
+        statements = self._statements
+        if sql in statements:
+            statements.move_to_end(sql)
+            self.hits += 1
+            return True
+        self.misses += 1
+        if self.size > 0:
+            statements[sql] = None
+            if len(statements) > self.size:
+                statements.popitem(last=False)
+                self.evictions += 1
+        return False
+
+    def __len__(self):
+        return len(self._statements)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": self.size,
+            "cached": len(self._statements),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class StatementCachingCursor(sqlite3.Cursor):
+    """Cursor that records its statements in the connection's cache"""
+
+    def execute(self, sql, parameters=()):
+        self.connection.statements.lookup(sql)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.connection.statements.lookup(sql)
+        return super().executemany(sql, seq_of_parameters)
+
+
+class StatementCachingConnection(sqlite3.Connection):
+    """sqlite3 connection whose statement cache is sized and observable
+
+    Accepts connect()'s cached_statements and keeps a StatementCache of the
+    same size in `statements`.
+    """
+
+    def __init__(self, *args, cached_statements=DEFAULT_SIZE, **kwargs):
+        super().__init__(*args, cached_statements=cached_statements,
+                         **kwargs)
+        self.statements = StatementCache(cached_statements)
+        with _live_lock:
+            _live.add(self)
+
+    def cursor(self, factory=StatementCachingCursor):
+        return super().cursor(factory)
+
+    # Connection.execute creates its cursor internally, bypassing cursor()
+    def execute(self, sql, parameters=()):
+        self.statements.lookup(sql)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.statements.lookup(sql)
+        return super().executemany(sql, seq_of_parameters)
+
+
+_live = weakref.WeakSet()  # open caching connections, for statement_stats()
+_live_lock = threading.Lock()
+
+
+def statement_stats(connections=None):
+    """Combined statement cache counters over `connections` (default: all)"""
+    if connections is None:
+        with _live_lock:
+            connections = list(_live)
+    totals = {"connections": 0, "hits": 0, "misses": 0, "evictions": 0}
+    for conn in connections:
+        stats = conn.statements.stats()
+        totals["connections"] += 1
+        for key in ("hits", "misses", "evictions"):
+            totals[key] += stats[key]
+    lookups = totals["hits"] + totals["misses"]
+    totals["hit_rate"] = totals["hits"] / lookups if lookups else 0.0
+    return totals
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the breaker module.
+"""
+
+import time
+import unittest
+
+from breaker import (CLOSED, HALF_OPEN, OPEN, CircuitBreaker,
+                     CircuitOpenError)
+
+
+def fail():
+    raise ConnectionRefusedError("database is down")
+
+
+def succeed():
+    return "ok"
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test cases for CircuitBreaker."""
+
+    def breaker(self, **options):
+        settings = {"failure_rate": 0.5, "window": 4, "min_calls": 4,
+                    "open_seconds": 0.05, "half_open_probes": 2}
+        settings.update(options)
+        return CircuitBreaker("test", **settings)
+
+    def trip(self, breaker):
+        for _ in range(4):
+            with self.assertRaises(ConnectionRefusedError):
+                breaker.call(fail)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_opens_at_failure_rate(self):
+        """Test that the breaker opens only once min_calls are seen."""
+        breaker = self.breaker()
+        for _ in range(3):
+            with self.assertRaises(ConnectionRefusedError):
+                breaker.call(fail)
+        self.assertEqual(breaker.state, CLOSED)
+        with self.assertRaises(ConnectionRefusedError):
+            breaker.call(fail)
+        self.assertEqual(breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.call(succeed)
+        self.assertEqual(breaker.rejected, 1)
+
+    def test_other_errors_do_not_count(self):
+        """Test that errors is_failure rejects leave the breaker closed."""
+        breaker = self.breaker()
+        for _ in range(8):
+            with self.assertRaises(ValueError):
+                breaker.call(int, "not a number")
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_half_open_probes_close(self):
+        """Test that enough successful probes close the breaker."""
+        breaker = self.breaker()
+        self.trip(breaker)
+        time.sleep(0.06)
+        self.assertEqual(breaker.call(succeed), "ok")
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertEqual(breaker.call(succeed), "ok")
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.snapshot()["transitions"],
+                         {"closed->open": 1, "open->half_open": 1,
+                          "half_open->closed": 1})
+
+    def test_failed_probe_reopens(self):
+        """Test that a failing probe sends the breaker back to open."""
+        breaker = self.breaker()
+        self.trip(breaker)
+        time.sleep(0.06)
+        with self.assertRaises(ConnectionRefusedError):
+            breaker.call(fail)
+        self.assertEqual(breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.call(succeed)
+
+    def test_probes_are_limited(self):
+        """Test that only half_open_probes calls are let through at once."""
+        breaker = self.breaker()
+        self.trip(breaker)
+        time.sleep(0.06)
+        probes = [breaker.admit(), breaker.admit()]
+        self.assertEqual(probes, [True, True])
+        with self.assertRaises(CircuitOpenError):
+            breaker.admit()
+        breaker.record(False, True)
+        breaker.record(False, True)
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertFalse(breaker.admit())
+
+
+if __name__ == "__main__":
+    unittest.main()
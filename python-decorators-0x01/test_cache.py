@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the cache module.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from decimal import Decimal
+
+from cache import (QueryCache, SQLiteBackend, make_key, msgpack,
+                   referenced_tables, written_table)
+
+
+KEY = make_key("users.db", "SELECT * FROM users")
+
+
+class BlockingLoader:
+    """Loader that returns `value` once released, counting its calls"""
+
+    def __init__(self, value=None, error=None):
+        self.value = value
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def in_thread(func):
+    """Run func on a thread; return (thread, outcome dict)"""
+    outcome = {}
+
+    def run():
+        try:
+            outcome["value"] = func()
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+class TestGetOrLoad(unittest.TestCase):
+    """Test cases for QueryCache.get_or_load."""
+
+    def test_hit_after_miss(self):
+        """Test that a loaded value is served from the cache next time."""
+        cache = QueryCache()
+        self.assertEqual(cache.get_or_load(KEY, lambda: [1]), ([1], "miss"))
+        self.assertEqual(cache.get_or_load(KEY, lambda: [2]), ([1], "hit"))
+
+    def test_concurrent_misses_coalesce(self):
+        """Test that concurrent misses run the loader once."""
+        cache = QueryCache()
+        loader = BlockingLoader([(1, "a")])
+        leader, first = in_thread(lambda: cache.get_or_load(KEY, loader))
+        loader.started.wait()
+        follower, second = in_thread(lambda: cache.get_or_load(KEY, loader))
+        while cache.coalesced == 0:
+            time.sleep(0.001)
+        loader.release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(loader.calls, 1)
+        self.assertEqual(first["value"], ([(1, "a")], "miss"))
+        self.assertEqual(second["value"], ([(1, "a")], "coalesced"))
+
+    def test_error_is_shared_with_waiters(self):
+        """Test that a failed load raises in every coalesced caller."""
+        cache = QueryCache()
+        error = RuntimeError("query failed")
+        loader = BlockingLoader(error=error)
+        leader, first = in_thread(lambda: cache.get_or_load(KEY, loader))
+        loader.started.wait()
+        follower, second = in_thread(lambda: cache.get_or_load(KEY, loader))
+        while cache.coalesced == 0:
+            time.sleep(0.001)
+        loader.release.set()
+        leader.join()
+        follower.join()
+        self.assertIs(first["error"], error)
+        self.assertIs(second["error"], error)
+        self.assertEqual(cache.get(KEY), (False, None))
+
+    def test_stale_entry_served_while_refreshing(self):
+        """Test that an expired entry is served while refresh replaces it."""
+        cache = QueryCache(ttl=0.05, stale_ttl=60)
+        cache.get_or_load(KEY, lambda: ["old"])
+        time.sleep(0.1)
+        refreshed = threading.Event()
+
+        def refresh():
+            refreshed.set()
+            return ["new"]
+
+        value = cache.get_or_load(KEY, lambda: ["miss"], refresh=refresh)
+        self.assertEqual(value, (["old"], "stale"))
+        refreshed.wait(5)
+        deadline = time.monotonic() + 5
+        while cache.get(KEY) != (True, ["new"]):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+
+    def test_failed_refresh_is_counted(self):
+        """Test that a failing background refresh is counted, not raised."""
+        cache = QueryCache(ttl=0.05, stale_ttl=60)
+        cache.get_or_load(KEY, lambda: ["old"])
+        time.sleep(0.1)
+        raised = []
+        previous_hook = threading.excepthook
+        threading.excepthook = raised.append
+        try:
+            def refresh():
+                raise RuntimeError("Connection pool is closed")
+
+            value = cache.get_or_load(KEY, lambda: ["miss"], refresh=refresh)
+            self.assertEqual(value, (["old"], "stale"))
+            deadline = time.monotonic() + 5
+            while cache.stats()["refresh_failures"] == 0:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.001)
+        finally:
+            threading.excepthook = previous_hook
+        self.assertEqual(raised, [])
+        self.assertEqual(cache.get_or_load(KEY, lambda: ["miss"],
+                                           refresh=refresh)[1], "stale")
+
+    def test_invalidation_during_load_discards_result(self):
+        """Test that a load racing an invalidation is not cached."""
+        cache = QueryCache()
+        loader = BlockingLoader(["before write"])
+        leader, first = in_thread(lambda: cache.get_or_load(KEY, loader))
+        loader.started.wait()
+        cache.invalidate_tables("users.db", {"users"})
+        second = cache.get_or_load(KEY, lambda: ["after write"])
+        loader.release.set()
+        leader.join()
+        self.assertEqual(first["value"], (["before write"], "miss"))
+        self.assertEqual(second, (["after write"], "miss"))
+        self.assertEqual(cache.get(KEY), (True, ["after write"]))
+        self.assertEqual(cache.stats()["discarded_loads"], 1)
+
+
+class TestSQLiteBackend(unittest.TestCase):
+    """Test cases for SQLiteBackend serialization."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def backend(self, serializer):
+        return SQLiteBackend(os.path.join(self.tmp.name, "cache.db"),
+                             serializer=serializer)
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack_keeps_result_types(self):
+        """Test that msgpack returns lists and rows as they were stored."""
+        cache = QueryCache(backend=self.backend("msgpack"))
+        rows = [(1, "a"), (2, "b")]
+        cache.set(KEY, rows)
+        self.assertEqual(cache.get(KEY), (True, rows))
+        row_key = make_key("users.db", "SELECT * FROM users WHERE id = ?",
+                           (1,))
+        cache.set(row_key, (1, "a"))
+        self.assertEqual(cache.get(row_key), (True, (1, "a")))
+
+    def test_eviction_keeps_totals(self):
+        """Test that LRU eviction and replacement keep the size totals."""
+        backend = SQLiteBackend(os.path.join(self.tmp.name, "cache.db"),
+                                max_entries=3)
+        cache = QueryCache(backend=backend)
+        keys = [make_key("users.db", f"SELECT {i} FROM users")
+                for i in range(5)]
+        for key in keys:
+            cache.set(key, [key[1]])
+            time.sleep(0.002)
+        cache.set(keys[-1], ["replaced"])
+        stats = backend.stats()
+        self.assertEqual(stats["entries"], 3)
+        self.assertEqual(stats["evictions"], 2)
+        self.assertEqual(cache.get(keys[0]), (False, None))
+        self.assertEqual(cache.get(keys[-1]), (True, ["replaced"]))
+        count, size = backend._conn().execute(
+            "SELECT COUNT(*), SUM(size) FROM cache_entries").fetchone()
+        self.assertEqual((stats["entries"], stats["bytes"]), (count, size))
+
+    def test_invalidation_in_other_process_refuses_store(self):
+        """Test that a load overtaken by another worker's invalidation of
+        the shared file is not stored."""
+        path = os.path.join(self.tmp.name, "cache.db")
+        worker, other = SQLiteBackend(path), SQLiteBackend(path)
+        cache = QueryCache(backend=worker)
+        loader = BlockingLoader(["before write"])
+        thread, _ = in_thread(lambda: cache.get_or_load(KEY, loader))
+        loader.started.wait(5)
+        other.invalidate_tables("users.db", {"users"})
+        loader.release.set()
+        thread.join(5)
+        self.assertEqual(cache.get(KEY), (False, None))
+        self.assertEqual(cache.stats()["discarded_loads"], 1)
+
+    def test_unserializable_result_is_returned_uncached(self):
+        """Test that a value the serializer rejects is still returned."""
+        serializers = ["pickle"] + (["msgpack"] if msgpack else [])
+        values = {"pickle": [(threading.Lock(),)],
+                  "msgpack": [(Decimal("1.5"),)]}
+        for serializer in serializers:
+            with self.subTest(serializer=serializer):
+                backend = self.backend(serializer)
+                cache = QueryCache(backend=backend)
+                value = values[serializer]
+                self.assertEqual(cache.get_or_load(KEY, lambda: value),
+                                 (value, "miss"))
+                self.assertEqual(cache.get(KEY), (False, None))
+                self.assertEqual(backend.stats()["unserializable"], 1)
+
+
+class TestStatementParsing(unittest.TestCase):
+    """Test cases for make_key, referenced_tables and written_table."""
+
+    def test_key_keeps_whitespace_inside_literals(self):
+        """Test that only whitespace outside quotes is normalized."""
+        spaced = make_key("users.db", "  SELECT *\n  FROM users "
+                          "WHERE name = 'a  b'  ")
+        self.assertEqual(spaced[1], "SELECT * FROM users WHERE name = 'a  b'")
+        self.assertNotEqual(
+            spaced, make_key("users.db",
+                             "SELECT * FROM users WHERE name = 'a b'"))
+
+    def test_referenced_tables(self):
+        """Test that joins, subqueries and qualified names are found."""
+        cases = {
+            "SELECT * FROM users u, orders o WHERE u.id = o.user_id":
+                {"users", "orders"},
+            'SELECT * FROM main.users JOIN "main"."orders" ON 1':
+                {"users", "orders"},
+            "SELECT * FROM (SELECT id FROM users) AS t, orders":
+                {"users", "orders"},
+            "WITH recent AS (SELECT * FROM orders) "
+            "SELECT * FROM recent JOIN users ON 1":
+                {"recent", "orders", "users"},
+            "SELECT 'FROM fake' FROM users -- FROM other": {"users"},
+        }
+        for sql, tables in cases.items():
+            with self.subTest(sql=sql):
+                self.assertEqual(referenced_tables(sql), tables)
+
+    def test_written_table(self):
+        """Test that the written table is found behind CTEs and schemas."""
+        cases = {
+            "UPDATE OR IGNORE main.users SET name = 'x'": "users",
+            "WITH ids AS (SELECT id FROM orders) "
+            "UPDATE users SET name = 'x' WHERE id IN ids": "users",
+            "WITH ids AS (SELECT 1) DELETE FROM [main].[users]": "users",
+            "INSERT INTO users SELECT * FROM staging": "users",
+            "WITH ids AS (SELECT 1) SELECT * FROM ids": None,
+            "SELECT 'UPDATE users' FROM orders": None,
+        }
+        for sql, table in cases.items():
+            with self.subTest(sql=sql):
+                self.assertEqual(written_table(sql), table)
+
+
+if __name__ == "__main__":
+    unittest.main()
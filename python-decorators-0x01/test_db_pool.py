@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the db_pool module.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+def make_database(directory):
+    """Create a small users.db in `directory` and return its path"""
+    path = os.path.join(directory, "users.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, "
+                 "email TEXT, age INTEGER)")
+    conn.executemany("INSERT INTO users (name, email, age) VALUES (?, ?, ?)",
+                     [(f"user{i}", f"user{i}@example.com", 20 + i)
+                      for i in range(10)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Test cases for ConnectionPool."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = make_database(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_reuses_released_connection(self):
+        """Test that a released connection is handed out again."""
+        pool = ConnectionPool(self.path, min_size=0, max_size=2)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            self.assertIs(first, second)
+        self.assertEqual(pool.stats()["created"], 1)
+        pool.close()
+
+    def test_timeout_when_exhausted(self):
+        """Test that acquire raises PoolTimeout once max_size are out."""
+        pool = ConnectionPool(self.path, min_size=0, max_size=1, timeout=0.05)
+        conn = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        pool.release(conn)
+        pool.close()
+
+    def test_release_rolls_back(self):
+        """Test that an open transaction is rolled back on release."""
+        pool = ConnectionPool(self.path, min_size=0, max_size=1)
+        with pool.connection() as conn:
+            conn.execute("DELETE FROM users")
+        with pool.connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM users").fetchone()
+        self.assertEqual(count, (10,))
+        pool.close()
+
+    def test_broken_connection_is_replaced(self):
+        """Test that a connection failing its health check is discarded."""
+        pool = ConnectionPool(self.path, min_size=0, max_size=1)
+        with pool.connection() as conn:
+            pass
+        conn.close()
+        with pool.connection() as fresh:
+            self.assertIsNot(fresh, conn)
+            self.assertEqual(fresh.execute("SELECT 1").fetchone(), (1,))
+        pool.close()
+
+    def test_pinned_connection(self):
+        """Test that connection() yields the pinned connection."""
+        pool = ConnectionPool(self.path, min_size=0, max_size=2)
+        conn = pool.acquire()
+        pool.pin(conn)
+        with pool.connection() as pinned:
+            self.assertIs(pinned, conn)
+        pool.unpin()
+        pool.release(conn)
+        pool.close()
+
+    def test_statement_stats_count_only_queries(self):
+        """Test that health checks and PRAGMAs are not counted as lookups."""
+        pool = ConnectionPool(self.path, min_size=0, max_size=1)
+        for user_id in range(1, 6):
+            with pool.connection() as conn:
+                conn.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+        stats = pool.stats()
+        self.assertEqual((stats["statement_hits"], stats["statement_misses"]),
+                         (4, 1))
+        pool.close()
+
+    def test_slow_connect_does_not_block_other_threads(self):
+        """Test that a connect in progress does not hold the pool lock."""
+        pool = ConnectionPool(self.path, min_size=1, max_size=2)
+        idle = pool.acquire()
+        connecting = threading.Event()
+        connect = pool._connect
+
+        def slow_connect():
+            connecting.set()
+            time.sleep(0.5)
+            return connect()
+
+        pool._connect = slow_connect
+        opener = threading.Thread(target=lambda: pool.release(pool.acquire()))
+        opener.start()
+        connecting.wait()
+        start = time.monotonic()
+        pool.release(idle)
+        with pool.connection():
+            pass
+        self.assertLess(time.monotonic() - start, 0.25)
+        opener.join()
+        self.assertEqual(pool.stats()["open"], 2)
+        pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
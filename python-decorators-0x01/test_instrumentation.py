@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the instrumentation module.
+"""
+
+import logging
+import random
+import unittest
+
+import instrumentation
+from instrumentation import (LatencyHistogram, QueryStats,
+                             configure_query_logging, fingerprint,
+                             log_queries, logger)
+
+
+class ListHandler(logging.Handler):
+    """Handler keeping the query records it receives"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record.query_record)
+
+
+class TestQueryLogging(unittest.TestCase):
+    """Test cases for configure_query_logging and log_queries."""
+
+    def setUp(self):
+        self.level = logger.level
+
+    def tearDown(self):
+        logger.setLevel(self.level)
+
+    def test_decorating_keeps_application_level(self):
+        """Test that log_queries neither resets the level nor starts the
+        listener when a function is decorated."""
+        logger.setLevel(logging.WARNING)
+        listener = instrumentation._listener
+
+        @log_queries
+        def run(query):
+            return []
+
+        self.assertEqual(logger.level, logging.WARNING)
+        self.assertIs(instrumentation._listener, listener)
+
+    def test_level_only_changes_when_given(self):
+        """Test that configure_query_logging keeps the level by default."""
+        handler = ListHandler()
+        logger.setLevel(logging.WARNING)
+        configure_query_logging(handler)
+        self.assertEqual(logger.level, logging.WARNING)
+
+        @log_queries(stats=False)
+        def run(query):
+            return []
+
+        run("SELECT 1")
+        configure_query_logging(handler, level=logging.INFO)
+        self.assertEqual(logger.level, logging.INFO)
+        run("SELECT 2")
+        configure_query_logging(logging.NullHandler())  # drains the queue
+        self.assertEqual([r["query"] for r in handler.records], ["SELECT 2"])
+
+
+class TestFingerprint(unittest.TestCase):
+    """Test cases for fingerprint."""
+
+    def test_literals_are_normalized(self):
+        """Test that queries differing only in literals share a fingerprint."""
+        self.assertEqual(
+            fingerprint("SELECT * FROM users WHERE id = 42 -- note"),
+            fingerprint("select *  from users\nwhere id = 7"))
+        self.assertEqual(
+            fingerprint("SELECT * FROM users WHERE name = 'O''Brien' "
+                        "AND score > 1.5e3"),
+            "select * from users where name = ? and score > ?")
+        self.assertEqual(
+            fingerprint("SELECT * FROM users WHERE name = :name"),
+            fingerprint("SELECT * FROM users WHERE name = ?"))
+
+    def test_in_lists_collapse(self):
+        """Test that IN lists of any length share a fingerprint."""
+        self.assertEqual(
+            fingerprint("SELECT * FROM users WHERE id IN (1, 2, 3)"),
+            "select * from users where id in (...)")
+        self.assertEqual(
+            fingerprint("SELECT * FROM users WHERE id IN (?)"),
+            fingerprint("SELECT * FROM users WHERE id IN (?, ?, ?, ?)"))
+
+    def test_identifiers_are_kept(self):
+        """Test that digits inside names are not taken for literals."""
+        self.assertEqual(fingerprint("SELECT col1 FROM t2"),
+                         "select col1 from t2")
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """Test cases for LatencyHistogram."""
+
+    def test_empty(self):
+        """Test that an empty histogram reports no percentile."""
+        self.assertIsNone(LatencyHistogram().percentile(50))
+
+    def test_small_values_are_exact(self):
+        """Test that values below 64us get a bucket of their own."""
+        histogram = LatencyHistogram()
+        for value in range(1, 51):
+            histogram.record(value)
+        self.assertEqual(histogram.percentile(50), 25.0)
+        self.assertEqual(histogram.percentile(100), 50.0)
+
+    def test_percentiles_within_three_percent(self):
+        """Test that percentiles of a wide distribution stay within 3%."""
+        rng = random.Random(5)
+        values = sorted(rng.lognormvariate(7, 1.5) for _ in range(20000))
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+        for p in (50, 90, 99, 99.9):
+            exact = values[int(p / 100 * len(values)) - 1]
+            self.assertAlmostEqual(histogram.percentile(p), exact,
+                                   delta=exact * 0.03 + 1)
+
+    def test_query_stats_percentiles(self):
+        """Test that QueryStats groups by fingerprint and reports ms."""
+        stats = QueryStats()
+        for i in range(100):
+            stats.record(f"SELECT * FROM users WHERE id = {i}", i + 1.0, 1)
+        (entry,) = stats.snapshot()
+        self.assertEqual(entry["calls"], 100)
+        self.assertEqual(entry["rows"], 100)
+        self.assertAlmostEqual(entry["p50_ms"], 50, delta=1.5)
+        self.assertAlmostEqual(entry["p99_ms"], 99, delta=3)
+
+
+if __name__ == "__main__":
+    unittest.main()
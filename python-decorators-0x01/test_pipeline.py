@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the pipeline module.
+"""
+
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+from cache import QueryCache
+from db_pool import ConnectionPool
+from breaker import HALF_OPEN, breakers
+from pipeline import (BreakerStage, CacheStage, PoolStage, QueryPipeline,
+                      RetryStage, TransactionStage)
+from test_db_pool import make_database
+from transactions import group_commit
+
+
+class TestQueryPipeline(unittest.TestCase):
+    """Test cases for QueryPipeline."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(make_database(self.tmp.name))
+        self.cache = QueryCache()
+        self.pipeline = QueryPipeline(
+            PoolStage(self.pool), CacheStage(self.cache),
+            RetryStage(retries=1), TransactionStage(self.cache))
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmp.cleanup()
+
+    def test_fetch_modes_are_cached_separately(self):
+        """Test that a cached fetch="one" row is not served for "all"."""
+        sql = "SELECT name FROM users WHERE id = ?"
+        one = self.pipeline.execute(sql, (1,), fetch="one")
+        rows = self.pipeline.execute(sql, (1,), fetch="all")
+        count = self.pipeline.execute(sql, (1,), fetch="rowcount")
+        self.assertEqual(one, ("user0",))
+        self.assertEqual(rows, [("user0",)])
+        self.assertIsInstance(count, int)
+        self.assertEqual(self.pipeline.execute(sql, (1,), fetch="one"), one)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_write_commits_and_invalidates(self):
+        """Test that a write is committed and drops cached reads."""
+        sql = "SELECT email FROM users WHERE id = ?"
+        self.pipeline.execute(sql, (1,), fetch="one")
+        changed = self.pipeline.execute(
+            "UPDATE users SET email = ? WHERE id = ?", ("new@example.com", 1),
+            fetch="rowcount")
+        self.assertEqual(changed, 1)
+        self.assertEqual(self.pipeline.execute(sql, (1,), fetch="one"),
+                         ("new@example.com",))
+        conn = sqlite3.connect(self.pool.database)
+        self.assertEqual(conn.execute(sql, (1,)).fetchone(),
+                         ("new@example.com",))
+        conn.close()
+
+    def test_writes_join_group_commit(self):
+        """Test that writes inside group_commit share its transactions."""
+        with group_commit(pool=self.pool, max_calls=2, max_delay=60) as group:
+            for user_id in range(1, 6):
+                self.pipeline.execute("UPDATE users SET age = 0 WHERE id = ?",
+                                      (user_id,), fetch="rowcount")
+        self.assertEqual(group.commits, 3)
+        # The group lock was released: another thread can take it
+        acquired = []
+        taker = threading.Thread(
+            target=lambda: acquired.append(group.lock.acquire(timeout=1)))
+        taker.start()
+        taker.join()
+        self.assertEqual(acquired, [True])
+        rows = self.pipeline.execute("SELECT COUNT(*) FROM users "
+                                     "WHERE age = 0", fetch="one")
+        self.assertEqual(rows, (5,))
+
+    def test_cache_hit_is_not_a_breaker_probe(self):
+        """Test that a cache hit during half-open neither closes the breaker
+        nor uses up its probe slot."""
+        stage = BreakerStage("test_pipeline.db", min_calls=1, window=1,
+                             open_seconds=0.01, half_open_probes=1)
+        self.addCleanup(breakers.pop, "test_pipeline.db")
+        pipeline = QueryPipeline(PoolStage(self.pool), stage,
+                                 CacheStage(self.cache))
+        sql = "SELECT name FROM users WHERE id = ?"
+        pipeline.execute(sql, (1,), fetch="one")
+        stage.breaker.record(True, False)
+        time.sleep(0.02)
+        self.assertEqual(pipeline.execute(sql, (1,), fetch="one"),
+                         ("user0",))
+        self.assertEqual(stage.breaker.state, HALF_OPEN)
+        pipeline.execute(sql, (2,), fetch="one")
+        self.assertEqual(stage.breaker.snapshot()["transitions"],
+                         {"closed->open": 1, "open->half_open": 1,
+                          "half_open->closed": 1})
+
+    def test_unknown_fetch_mode(self):
+        """Test that an unknown fetch mode raises ValueError."""
+        with self.assertRaises(ValueError):
+            self.pipeline.execute("SELECT 1", fetch="many")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the retry module.
+"""
+
+import contextlib
+import io
+import random
+import sqlite3
+import time
+import unittest
+
+from retry import (RetryBudget, is_transient, next_delay,
+                   retry_on_failure)
+
+
+class MySQLError(Exception):
+    """Stand-in for mysql.connector errors, which carry an errno"""
+
+    def __init__(self, errno):
+        super().__init__(f"MySQL error {errno}")
+        self.errno = errno
+
+
+def quietly(func, *args):
+    """Call func with the retry warnings kept off stdout"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+
+class TestIsTransient(unittest.TestCase):
+    """Test cases for is_transient."""
+
+    def test_transient_errors(self):
+        """Test that lock contention and dropped connections are retried."""
+        for error in (sqlite3.OperationalError("database is locked"),
+                      sqlite3.OperationalError("database table is locked"),
+                      ConnectionResetError(), TimeoutError(),
+                      MySQLError(1205), MySQLError(1213), MySQLError(2003),
+                      MySQLError(2006), MySQLError(2055)):
+            with self.subTest(error=error):
+                self.assertTrue(is_transient(error))
+
+    def test_permanent_errors(self):
+        """Test that programming and data errors are not retried."""
+        for error in (sqlite3.OperationalError("no such table: users"),
+                      sqlite3.IntegrityError("UNIQUE constraint failed"),
+                      ValueError("bad value"), MySQLError(1064)):
+            with self.subTest(error=error):
+                self.assertFalse(is_transient(error))
+
+
+class TestNextDelay(unittest.TestCase):
+    """Test cases for next_delay."""
+
+    def delay(self, attempt, retries=5, delay=1.0, max_delay=4.0,
+              deadline_at=None, budget=False):
+        return quietly(next_delay, TimeoutError(), attempt, retries, delay,
+                       max_delay, deadline_at, is_transient, budget)
+
+    def test_full_jitter_bounds(self):
+        """Test that waits stay within [0, min(max_delay, delay * 2^n)]."""
+        random.seed(6)
+        for attempt, cap in ((0, 1.0), (1, 2.0), (2, 4.0), (3, 4.0)):
+            waits = [self.delay(attempt) for _ in range(200)]
+            self.assertTrue(all(0 <= wait <= cap for wait in waits))
+            self.assertGreater(max(waits), cap * 0.8)
+
+    def test_gives_up(self):
+        """Test that retries stop at the limit, deadline or a permanent
+        error."""
+        self.assertIsNone(self.delay(4))
+        self.assertIsNone(self.delay(0, deadline_at=time.monotonic()))
+        self.assertIsNone(quietly(next_delay, ValueError(), 0, 5, 1.0, 4.0,
+                                  None, is_transient, False))
+
+
+class TestRetryBudget(unittest.TestCase):
+    """Test cases for RetryBudget."""
+
+    def test_exhaustion_and_refill(self):
+        """Test that retries stop when tokens run out and resume as calls
+        deposit more."""
+        budget = RetryBudget(ratio=0.5, max_tokens=2.0)
+        self.assertTrue(budget.withdraw())
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+        self.assertEqual(budget.denied, 1)
+        budget.deposit()
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+
+    def test_deposits_are_capped(self):
+        """Test that idle periods cannot bank more than max_tokens."""
+        budget = RetryBudget(ratio=1.0, max_tokens=2.0)
+        for _ in range(10):
+            budget.deposit()
+        self.assertEqual(sum(budget.withdraw() for _ in range(5)), 2)
+
+    def test_exhausted_budget_stops_decorator(self):
+        """Test that retry_on_failure raises once the budget is spent."""
+        budget = RetryBudget(ratio=0.0, max_tokens=1.0)
+        calls = []
+
+        @retry_on_failure(retries=5, delay=0, budget=budget)
+        def flaky():
+            calls.append(1)
+            raise TimeoutError("busy")
+
+        with self.assertRaises(TimeoutError):
+            quietly(flaky)
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
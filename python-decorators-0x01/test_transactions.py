@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the transactions module.
+"""
+
+import contextlib
+import io
+import sqlite3
+import tempfile
+import time
+import unittest
+
+import db_pool
+from cache import query_cache
+from test_db_pool import make_database
+from transactions import group_commit, transactional
+
+cache_query = __import__("4-cache_query").cache_query
+
+
+@cache_query
+def fetch_age(conn, query, params=()):
+    """Cached read, as in 4-cache_query"""
+    return conn.execute(query, params).fetchone()[0]
+
+
+def read_age(user_id):
+    """fetch_age on a pooled connection"""
+    with db_pool.get_pool().connection() as conn:
+        return fetch_age(conn, "SELECT age FROM users WHERE id = ?",
+                         (user_id,))
+
+
+@transactional
+def set_age(conn, user_id, age):
+    """Update one user's age"""
+    conn.execute("UPDATE users SET age = ? WHERE id = ?", (age, user_id))
+
+
+def update_age(user_id, age):
+    """set_age on a pooled connection, as with_db_connection would"""
+    with db_pool.get_pool().connection() as conn:
+        set_age(conn, user_id, age)
+
+
+class TestGroupCommit(unittest.TestCase):
+    """Test cases for group_commit."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = make_database(self.tmp.name)
+        db_pool.configure_pool(database=self.path)
+        query_cache.clear()
+
+    def tearDown(self):
+        db_pool.get_pool().close()
+        self.tmp.cleanup()
+
+    def ages(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            return [age for (age,) in
+                    conn.execute("SELECT age FROM users ORDER BY id")]
+        finally:
+            conn.close()
+
+    def test_commits_in_batches(self):
+        """Test that calls are committed every max_calls calls."""
+        with group_commit(max_calls=4, max_delay=60) as group:
+            for user_id in range(1, 11):
+                update_age(user_id, 99)
+        self.assertEqual(group.commits, 3)
+        self.assertEqual(self.ages(), [99] * 10)
+
+    def test_failed_call_rolls_back_alone(self):
+        """Test that a failing call undoes only its own work."""
+        @transactional
+        def update_then_fail(conn):
+            conn.execute("UPDATE users SET age = 0 WHERE id = 2")
+            raise ValueError("bad update")
+
+        with group_commit(max_delay=60) as group:
+            update_age(1, 50)
+            with db_pool.get_pool().connection() as conn:
+                with self.assertRaises(ValueError):
+                    update_then_fail(conn)
+            update_age(3, 52)
+        self.assertEqual(group.failed, 1)
+        self.assertEqual(self.ages()[:3], [50, 21, 52])
+
+    def test_exception_rolls_back_pending(self):
+        """Test that leaving the block with an error drops pending calls."""
+        with self.assertRaises(RuntimeError):
+            with group_commit(max_calls=2, max_delay=60):
+                for user_id in range(1, 4):
+                    update_age(user_id, 70)
+                raise RuntimeError("abort")
+        self.assertEqual(self.ages()[:3], [70, 70, 22])
+
+    def test_pause_commits_after_max_delay(self):
+        """Test that an idle group commits and frees the write lock."""
+        with group_commit(max_delay=0.05) as group:
+            update_age(1, 80)
+            time.sleep(0.3)
+            other = sqlite3.connect(self.path, timeout=0)
+            try:
+                other.execute("UPDATE users SET age = 81 WHERE id = 2")
+                other.commit()
+            finally:
+                other.close()
+            self.assertEqual(group.timed_commits, 1)
+        self.assertEqual(self.ages()[:2], [80, 81])
+
+    def test_batch_timer_starts_at_first_call(self):
+        """Test that an idle spell before the first call does not make the
+        batch due at once."""
+        with group_commit(max_delay=0.2) as group:
+            time.sleep(0.3)
+            update_age(1, 90)
+            self.assertEqual(group.commits, 0)
+        self.assertEqual(group.timed_commits, 0)
+        self.assertEqual(self.ages()[0], 90)
+
+    def test_uncommitted_reads_are_not_cached(self):
+        """Test that reads of a group's pending writes skip the cache and
+        a rollback leaves no trace of them."""
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(read_age(1), 20)
+            with self.assertRaises(RuntimeError):
+                with group_commit(max_delay=60):
+                    update_age(1, 75)
+                    self.assertEqual(read_age(1), 75)
+                    raise RuntimeError("abort")
+            self.assertEqual(read_age(1), 20)
+        self.assertEqual(query_cache.stats()["entries"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
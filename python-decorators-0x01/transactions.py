@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Transaction decorators: per-call commits and group commit
+
+transactional commits after every call. Inside a `with group_commit():`
+block the same calls instead share one transaction committed every
+max_calls calls or max_delay seconds, each call wrapped in a SAVEPOINT so
+a failing call rolls back only its own work.
+"""
+
+import functools
+import sqlite3
+import threading
+import time
+
+from cache import query_cache, written_table
+from db_pool import get_pool
+
+_active = threading.local()
+
+
+def current_group():
+    """The GroupCommit active on this thread, or None"""
+    return getattr(_active, "group", None)
+
+
+def has_uncommitted_writes(conn):
+    """Whether conn's open transaction has written anything: reads on it
+    may see rows no other connection can, and must not be cached"""
+    group = current_group()
+    if group is not None and group.conn is conn:
+        # The group transaction is always open; only its writes count
+        return bool(group._written)
+    return conn.in_transaction
+
+
+def _control(conn, sql):
+    """Run group bookkeeping SQL past the pool's statement accounting, so
+    uniquely named savepoints neither fill the statement cache nor add a
+    query_stats entry per call"""
+    sqlite3.Connection.execute(conn, sql)
+
+
+def _write_tracker(written):
+    """sqlite3 trace callback collecting the tables statements write to"""
+    def track_writes(statement):
+        table = written_table(statement)
+        if table:
+            written.add(table)
+    return track_writes
+
+
+def transactional(func):
+    """Decorator to manage transactions (commit/rollback)
+
+    After a successful commit, cached query results that read from any
+    table written during the transaction are invalidated. Within an active
+    group_commit on the same connection, the call joins the group instead.
+    """
+    @functools.wraps(func)
+    def wrapper(conn, *args, **kwargs):
+        group = current_group()
+        if group is not None and group.conn is conn:
+            return group.run(func, conn, *args, **kwargs)
+
+        written = set()
+        conn.set_trace_callback(_write_tracker(written))
+        try:
+            result = func(conn, *args, **kwargs)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.set_trace_callback(None)
+        if written:
+            query_cache.invalidate_tables(getattr(conn, "database", None),
+                                          written)
+        return result
+    return wrapper
+
+
+class GroupCommit:
+    """
+    Batch transactional calls on this thread into shared transactions
+
+    Pins one pooled connection to the thread so with_db_connection hands it
+    to every call, runs each transactional call inside its own SAVEPOINT,
+    and commits once max_calls calls have succeeded or max_delay seconds
+    have passed since the first call of the batch -- also when the block
+    goes quiet, so a pause never holds SQLite's write lock for longer than
+    max_delay. Leaving the block normally commits what is pending; leaving
+    it with an exception rolls back the calls not yet committed (earlier
+    groups stay committed). Either way, cached results of the tables
+    written are dropped, as reads inside the group may have seen them.
+
+    Calls and commits are serialized on `lock`; code that runs statements
+    on the group's connection outside run() should hold it meanwhile.
+    """
+
+    def __init__(self, pool=None, max_calls=1000, max_delay=0.05):
+        self.pool = pool
+        self.max_calls = max_calls
+        self.max_delay = max_delay
+        self.conn = None
+        self.pending = 0
+        self.commits = 0
+        self.timed_commits = 0
+        self.failed = 0
+        self.lock = threading.Condition(threading.RLock())
+        self._written = set()
+        self._started = 0.0
+        self._savepoints = 0
+        self._flusher = None
+
+    def __enter__(self):
+        if current_group() is not None:
+            raise RuntimeError("group_commit blocks cannot be nested")
+        self.pool = self.pool or get_pool()
+        self.conn = self.pool.acquire()
+        self.pool.pin(self.conn)
+        self.conn.set_trace_callback(_write_tracker(self._written))
+        self._begin()
+        _active.group = self
+        self._flusher = threading.Thread(target=self._flush_when_due,
+                                         daemon=True)
+        self._flusher.start()
+        return self
+
+    def _begin(self):
+        _control(self.conn, "BEGIN")
+
+    def _due(self):
+        return time.monotonic() - self._started >= self.max_delay
+
+    def _flush_when_due(self):
+        """Flusher thread: commit pending calls once max_delay has passed,
+        even if no further call arrives to notice"""
+        with self.lock:
+            while self.conn is not None:
+                if not self.pending:
+                    # Woken by the next batch's first call, or by __exit__
+                    self.lock.wait()
+                    continue
+                wait = self._started + self.max_delay - time.monotonic()
+                if wait > 0:
+                    self.lock.wait(wait)
+                    continue
+                self.flush()
+                self.timed_commits += 1
+
+    def run(self, func, conn, *args, **kwargs):
+        """Run one transactional call inside its own savepoint"""
+        with self.lock:
+            self._savepoints += 1
+            name = f"group_call_{self._savepoints}"
+            _control(conn, f"SAVEPOINT {name}")
+            try:
+                result = func(conn, *args, **kwargs)
+            except Exception:
+                _control(conn, f"ROLLBACK TO {name}")
+                _control(conn, f"RELEASE {name}")
+                self.failed += 1
+                raise
+            _control(conn, f"RELEASE {name}")
+            self.record_call()
+            return result
+
+    def record_call(self):
+        """Count one successful call, committing if the group is due"""
+        with self.lock:
+            self.pending += 1
+            if self.pending == 1:
+                # First call of a batch: have the flusher time its max_delay
+                self._started = time.monotonic()
+            if self.pending >= self.max_calls or self._due():
+                self.flush()
+            elif self.pending == 1:
+                self.lock.notify()
+
+    def flush(self):
+        """Commit the pending calls and start the next group transaction"""
+        with self.lock:
+            self.conn.commit()
+            self.commits += 1
+            self.pending = 0
+            if self._written:
+                query_cache.invalidate_tables(
+                    getattr(self.conn, "database", None), self._written)
+                self._written.clear()
+            self._begin()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _active.group = None
+        with self.lock:
+            conn, self.conn = self.conn, None
+            self.lock.notify()
+        self._flusher.join()
+        try:
+            if exc_type is None:
+                conn.commit()
+                self.commits += 1
+            else:
+                conn.rollback()
+            if self._written:
+                query_cache.invalidate_tables(
+                    getattr(conn, "database", None), self._written)
+        finally:
+            conn.set_trace_callback(None)
+            self.pool.unpin()
+            self.pool.release(conn)
+
+
+def group_commit(pool=None, max_calls=1000, max_delay=0.05):
+    """Context manager batching transactional calls into group commits"""
+    return GroupCommit(pool, max_calls, max_delay)
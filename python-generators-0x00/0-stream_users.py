@@ -7,25 +7,78 @@ import mysql.connector
 from mysql.connector import Error
 
 
-def stream_users():
+class UserRow:
+    """Lightweight, dict-free row of the user_data table."""
+
+    __slots__ = ("user_id", "name", "email", "age")
+
+    def __init__(self, user_id, name, email, age):
+        self.user_id = user_id
+        self.name = name
+        self.email = email
+        self.age = age
+
+    def __repr__(self):
+        return (f"UserRow(user_id={self.user_id!r}, name={self.name!r}, "
+                f"email={self.email!r}, age={self.age!r})")
+
+
+ROW_TYPES = ("dict", "tuple", "row")
+
+
+def stream_users(streaming=False, row_type="dict", fetch_size=1000):
     """
     Generator function to stream rows one by one from the user_data table.
-    Yields each row as a dictionary.
+    Yields each row as a dictionary by default.
+
+    Args:
+        streaming (bool): use an explicitly unbuffered cursor so rows are
+            read from the server `fetch_size` at a time as they are consumed,
+            keeping memory bounded regardless of table size
+        row_type (str): "dict", "tuple" or "row" (a UserRow instance)
+        fetch_size (int): rows pulled from the server per round in
+            streaming mode
+
+    Yields:
+        dict, tuple or UserRow: one user row at a time
     """
+    if row_type not in ROW_TYPES:
+        raise ValueError(f"row_type must be one of {ROW_TYPES}, got {row_type!r}")
+
+    connection = None
+    cursor = None
     try:
         # Connect directly to ALX_prodev database
         connection = mysql.connector.connect(
             host="localhost",
             user="root",
             password="your_password",  # 🔴 Replace with your MySQL password
-            database="ALX_prodev"
+            database="ALX_prodev",
+            # Let an abandoned stream drain instead of erroring on close
+            consume_results=streaming
         )
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM user_data;")
 
-        # Use a single loop and yield rows
-        for row in cursor:
-            yield row
+        if not streaming:
+            cursor = connection.cursor(dictionary=(row_type == "dict"))
+            cursor.execute("SELECT * FROM user_data;")
+            for row in cursor:
+                yield UserRow(*row) if row_type == "row" else row
+            return
+
+        cursor = connection.cursor(buffered=False)
+        cursor.execute("SELECT user_id, name, email, age FROM user_data;")
+        columns = cursor.column_names
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                if row_type == "tuple":
+                    yield row
+                elif row_type == "row":
+                    yield UserRow(*row)
+                else:
+                    yield dict(zip(columns, row))
 
     except Error as e:
         print(f"Error streaming users: {e}")
@@ -4,22 +4,133 @@ Batch processing with Python generators.
 
 - stream_users_in_batches(batch_size): yields rows from the user_data table in batches
 - batch_processing(batch_size): yields users over age 25 from each batch
+- read_ahead(batches, depth): fetches upcoming batches on a background thread
+- filter_users_in_batches(batch_size, predicates): batches filtered in SQL
+  where possible, in Python otherwise
 """
 
+import operator
+import queue
+import threading
+
 import mysql.connector
 from mysql.connector import Error
 
 
-def stream_users_in_batches(batch_size):
+_DONE = object()
+
+# Columns and comparison operators that may be compiled into a WHERE clause
+PUSHDOWN_COLUMNS = ("user_id", "name", "email", "age")
+PUSHDOWN_OPERATORS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+class _Failure:
+    """Carries an exception from the read-ahead thread to the consumer."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def read_ahead(batches, depth):
     """
-    Generator that fetches rows in batches from the user_data table.
+    Generator that keeps up to `depth` batches fetched ahead of the consumer.
+
+    A background thread drains `batches` into a bounded queue, so fetching
+    batch k+1 overlaps with the consumer processing batch k, while a full
+    queue blocks the producer (backpressure). Errors raised while fetching
+    are re-raised in the consumer. Closing this generator stops the
+    producer and closes `batches` from the thread that iterated it.
 
     Args:
-        batch_size (int): number of rows per batch
+        batches (iterable): source of batches, iterated on the background thread
+        depth (int): maximum number of batches queued ahead
 
     Yields:
-        list of dict: batch of users
+        the items of `batches`, in order
     """
+    pending = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for batch in batches:
+                if not put(batch):
+                    return
+            put(_DONE)
+        except BaseException as e:  # handed over to the consumer
+            put(_Failure(e))
+        finally:
+            close = getattr(batches, "close", None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = pending.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+
+def compile_predicates(predicates):
+    """
+    Split predicates into a parameterized WHERE clause and Python filters.
+
+    Args:
+        predicates (iterable): each either a (column, operator, value)
+            comparison on a user_data column, which is pushed down to SQL,
+            or a callable taking a row dict and returning a bool, which
+            cannot be pushed down and is applied in Python
+
+    Returns:
+        tuple: (where_sql, params, python_filters)
+
+    Raises:
+        ValueError: for a comparison on an unknown column or operator.
+    """
+    clauses = []
+    params = []
+    python_filters = []
+    for predicate in predicates:
+        if callable(predicate):
+            python_filters.append(predicate)
+            continue
+        column, op, value = predicate
+        if column not in PUSHDOWN_COLUMNS or op not in PUSHDOWN_OPERATORS:
+            raise ValueError(f"Unsupported predicate: {predicate!r}")
+        clauses.append(f"{column} {op} %s")
+        params.append(value)
+    where_sql = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return where_sql, tuple(params), python_filters
+
+
+def _fetch_batches(batch_size, where_sql="", params=()):
+    """Fetch rows of user_data `batch_size` at a time on one connection."""
+    connection = None
+    cursor = None
     try:
         connection = mysql.connector.connect(
             host="localhost",
@@ -28,7 +139,7 @@ def stream_users_in_batches(batch_size):
             database="ALX_prodev"
         )
         cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM user_data;")
+        cursor.execute(f"SELECT * FROM user_data{where_sql};", params)
 
         while True:
             batch = cursor.fetchmany(batch_size)
@@ -46,17 +157,67 @@ def stream_users_in_batches(batch_size):
             connection.close()
 
 
-def batch_processing(batch_size):
+def stream_users_in_batches(batch_size, prefetch=0):
+    """
+    Generator that fetches rows in batches from the user_data table.
+
+    Args:
+        batch_size (int): number of rows per batch
+        prefetch (int): if > 0, keep this many batches fetched ahead on a
+            background thread (see read_ahead)
+
+    Yields:
+        list of dict: batch of users
+    """
+    batches = _fetch_batches(batch_size)
+    if prefetch > 0:
+        batches = read_ahead(batches, prefetch)
+    yield from batches
+
+
+def filter_users_in_batches(batch_size, predicates, prefetch=0):
+    """
+    Generator that yields batches of users matching every predicate.
+
+    Comparisons are evaluated by MySQL (and can use its indexes); only
+    callable predicates are applied to the fetched rows in Python, so a
+    batch may come back shorter than batch_size but never empty.
+
+    Args:
+        batch_size (int): number of rows fetched per batch
+        predicates (iterable): see compile_predicates
+        prefetch (int): batches to fetch ahead of filtering (0 disables)
+
+    Yields:
+        list of dict: batch of matching users
+    """
+    where_sql, params, python_filters = compile_predicates(predicates)
+    batches = _fetch_batches(batch_size, where_sql, params)
+    if prefetch > 0:
+        batches = read_ahead(batches, prefetch)
+    for batch in batches:
+        if python_filters:
+            batch = [user for user in batch
+                     if all(keep(user) for keep in python_filters)]
+            if not batch:
+                continue
+        yield batch
+
+
+def batch_processing(batch_size, prefetch=0):
     """
     Generator that processes batches and yields users over age 25.
 
+    The age filter runs in SQL, so only matching rows leave the server.
+
     Args:
         batch_size (int): number of rows per batch
+        prefetch (int): batches to fetch ahead of processing (0 disables)
 
     Yields:
         dict: user row where age > 25
     """
-    for batch in stream_users_in_batches(batch_size):  # loop #1
+    predicates = [("age", ">", 25)]
+    for batch in filter_users_in_batches(batch_size, predicates, prefetch):  # loop #1
         for user in batch:  # loop #2
-            if int(user["age"]) > 25:
-                yield user  # use yield instead of print/return
+            yield user  # use yield instead of print/return
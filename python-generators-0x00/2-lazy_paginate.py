@@ -3,46 +3,181 @@
 Lazy pagination with Python generators.
 
 - paginate_users(page_size, offset): fetch a single page from user_data table
-- lazy_pagination(page_size): lazily yields each page using a generator
+- paginate_users_after(page_size, last_user_id): fetch the page after a key
+- lazy_pagination(page_size, keyset, cursor): lazily yields each page
+- page_cursor(page) / decode_cursor(token): resumable keyset cursor tokens
+- PageSession: one connection and prepared page queries shared by a sweep
 """
 
+import base64
+import json
+
 import seed
 
 
-def paginate_users(page_size, offset):
+OFFSET_QUERY = "SELECT * FROM user_data LIMIT %s OFFSET %s"
+FIRST_PAGE_QUERY = "SELECT * FROM user_data ORDER BY user_id LIMIT %s"
+KEYSET_QUERY = (
+    "SELECT * FROM user_data WHERE user_id > %s ORDER BY user_id LIMIT %s"
+)
+
+
+class PageSession:
+    """
+    A connection plus prepared page statements reused across many pages.
+
+    Each distinct page query is prepared once on the server and then only
+    re-executed with new parameters, so a sweep pays one connect/auth
+    handshake and one parse per query shape instead of one per page.
+    Closed by close(), by leaving a `with` block, or when garbage-collected.
+    """
+
+    def __init__(self, connection=None):
+        self.connection = connection or seed.connect_to_prodev()
+        self._statements = {}
+
+    def fetch(self, query, params):
+        """Execute a prepared page query and return its rows as dicts."""
+        cursor = self._statements.get(query)
+        if cursor is None:
+            cursor = self.connection.cursor(prepared=True)
+            self._statements[query] = cursor
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        columns = cursor.column_names
+        return [dict(zip(columns, row)) for row in rows]
+
+    def close(self):
+        """Close the prepared statements and the connection (idempotent)."""
+        for cursor in self._statements.values():
+            cursor.close()
+        self._statements.clear()
+        if self.connection is not None:
+            if self.connection.is_connected():
+                self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def _fetch_page(session, query, params):
+    """Run a page query on `session`, or on a one-off session if None."""
+    if session is not None:
+        return session.fetch(query, params)
+    with PageSession() as one_off:
+        return one_off.fetch(query, params)
+
+
+def paginate_users(page_size, offset, session=None):
     """
     Fetch a single page of users from the database.
 
     Args:
         page_size (int): number of rows per page
         offset (int): starting row offset
+        session (PageSession): reuse this session's connection, or None
+            to open and close a connection for this page only
+
+    Returns:
+        list of dict: rows fetched from the table
+    """
+    return _fetch_page(session, OFFSET_QUERY, (page_size, offset))
+
+
+def paginate_users_after(page_size, last_user_id=None, session=None):
+    """
+    Fetch the page of users that follows last_user_id in primary-key order.
+
+    Seeks on the user_id primary key instead of skipping `offset` rows,
+    so every page costs the same no matter how deep into the table it is.
+
+    Args:
+        page_size (int): number of rows per page
+        last_user_id (str): user_id of the last row already seen,
+            or None to start from the beginning
+        session (PageSession): reuse this session's connection, or None
+            to open and close a connection for this page only
 
     Returns:
         list of dict: rows fetched from the table
     """
-    connection = seed.connect_to_prodev()
-    cursor = connection.cursor(dictionary=True)
-    cursor.execute(f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}")
-    rows = cursor.fetchall()
-    cursor.close()
-    connection.close()
-    return rows
+    if last_user_id is None:
+        return _fetch_page(session, FIRST_PAGE_QUERY, (page_size,))
+    return _fetch_page(session, KEYSET_QUERY, (last_user_id, page_size))
 
 
-def lazy_pagination(page_size):
+def encode_cursor(last_user_id):
+    """Encode the last seen user_id as an opaque, URL-safe cursor token."""
+    payload = json.dumps({"after": last_user_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_cursor(token):
+    """
+    Decode a cursor token produced by encode_cursor/page_cursor.
+
+    Raises:
+        ValueError: if the token is malformed.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return payload["after"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"Invalid pagination cursor: {token!r}") from e
+
+
+def page_cursor(page):
+    """
+    Return the token that resumes keyset pagination right after `page`.
+
+    Args:
+        page (list of dict): a page yielded by lazy_pagination(keyset=True)
+    """
+    return encode_cursor(page[-1]["user_id"])
+
+
+def lazy_pagination(page_size, keyset=False, cursor=None):
     """
     Generator that lazily fetches pages of users from user_data table.
 
+    All pages are fetched over one PageSession, which is closed as soon as
+    the generator finishes, is closed, or is garbage-collected.
+
     Args:
         page_size (int): number of rows per page
+        keyset (bool): seek on user_id instead of using LIMIT/OFFSET,
+            giving constant cost per page and a stable key order
+        cursor (str): token from page_cursor() to resume a keyset sweep
+            after the page it was taken from (implies keyset=True)
 
     Yields:
         list of dict: one page of users at a time
     """
-    offset = 0
-    while True:  # only one loop
-        page = paginate_users(page_size, offset)
-        if not page:
-            break
-        yield page
-        offset += page_size
+    with PageSession() as session:
+        if keyset or cursor is not None:
+            last_user_id = decode_cursor(cursor) if cursor is not None else None
+            while True:
+                page = paginate_users_after(page_size, last_user_id, session)
+                if not page:
+                    break
+                yield page
+                last_user_id = page[-1]["user_id"]
+            return
+
+        offset = 0
+        while True:  # only one loop
+            page = paginate_users(page_size, offset, session)
+            if not page:
+                break
+            yield page
+            offset += page_size
@@ -5,6 +5,9 @@ Memory-Efficient Aggregation with Generators
 
 import sqlite3
 
+from aggregates import AggregatePlan, summarize
+
+
 def stream_user_ages():
     """
     Generator that yields user ages one by one
@@ -19,21 +22,58 @@ def stream_user_ages():
     conn.close()
 
 
+def stream_user_age_batches(batch_size=1000, database="users.db"):
+    """
+    Generator that yields user ages in lists of up to batch_size
+    """
+    conn = sqlite3.connect(database)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT age FROM users")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [row[0] for row in rows]
+    finally:
+        conn.close()
+
+
+def age_statistics(batch_size=1000, quantiles=(0.5, 0.9, 0.99),
+                   database="users.db"):
+    """
+    Count, sum, mean, variance, min, max and approximate quantiles of user
+    ages, computed in one pass with constant memory
+    """
+    return summarize(stream_user_age_batches(batch_size, database), quantiles)
+
+
+def aggregate_ages(func="avg", group_by=None, explain=False,
+                   database="users.db"):
+    """
+    Aggregate user ages, letting SQLite compute it when it can (AVG, COUNT,
+    SUM, MIN, MAX, optionally grouped) and streaming otherwise
+    """
+    plan = AggregatePlan(func, "age", "users", group_by)
+    if explain:
+        print(plan.explain())
+    conn = sqlite3.connect(database)
+    try:
+        return plan.execute(conn)
+    finally:
+        conn.close()
+
+
 def calculate_average_age():
     """
     Calculate the average age without loading entire dataset into memory
     """
-    total_age = 0
-    count = 0
-
-    for age in stream_user_ages():
-        total_age += age
-        count += 1
+    average = aggregate_ages("avg")
 
-    if count == 0:
+    if average is None:
         print("Average age of users: 0")
     else:
-        print(f"Average age of users: {total_age / count:.2f}")
+        print(f"Average age of users: {average:.2f}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+One-pass, constant-memory aggregates over streamed values.
+
+- RunningStats: count, sum, mean, variance (Welford), min and max
+- P2Quantile: approximate quantile with the P-squared algorithm
+- summarize(batches, quantiles): all of the above in a single pass
+- AggregatePlan: run an aggregate in SQLite when it can, stream it when not
+"""
+
+import math
+import re
+import sqlite3
+
+
+class RunningStats:
+    """
+    Streaming count/sum/mean/variance/min/max in O(1) memory.
+
+    Mean and variance use Welford's update, which stays numerically stable
+    where the naive sum-of-squares formula cancels catastrophically.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """Fold one value into the statistics."""
+        value = float(value)
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def update(self, values):
+        """Fold a batch of values into the statistics."""
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        """Combine with statistics gathered over a disjoint set of values."""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.__dict__.update(other.__dict__)
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        """Population variance (0.0 for fewer than two values)."""
+        return self._m2 / self.count if self.count > 1 else 0.0
+
+    @property
+    def sample_variance(self):
+        """Sample (n - 1) variance (0.0 for fewer than two values)."""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self):
+        """Population standard deviation."""
+        return math.sqrt(self.variance)
+
+    def as_dict(self):
+        """Return the statistics as a plain dictionary."""
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.mean if self.count else None,
+            "variance": self.variance,
+            "stddev": self.stddev,
+            "min": self.min,
+            "max": self.max,
+        }
+
+
+class P2Quantile:
+    """
+    Approximate p-quantile of a stream using five markers (Jain & Chlamtac).
+
+    Memory is constant; the estimate is exact for the first five values and
+    converges on the true quantile for well-behaved distributions.
+    """
+
+    def __init__(self, p):
+        if not 0.0 < p < 1.0:
+            raise ValueError(f"quantile must be in (0, 1), got {p!r}")
+        self.p = p
+        self._heights = []
+        self._positions = [0, 1, 2, 3, 4]
+        self._desired = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]
+        self._increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, value):
+        """Fold one value into the estimate."""
+        value = float(value)
+        q = self._heights
+        if len(q) < 5:
+            q.append(value)
+            q.sort()
+            return
+
+        n = self._positions
+        if value < q[0]:
+            q[0] = value
+            k = 0
+        elif value >= q[4]:
+            q[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or \
+                    (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                height = self._parabolic(i, step)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + step * (q[i + step] - q[i]) / \
+                        (n[i + step] - n[i])
+                q[i] = height
+                n[i] += step
+
+    def _parabolic(self, i, step):
+        """Piecewise-parabolic prediction of marker i moved by `step`."""
+        q, n = self._heights, self._positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def update(self, values):
+        """Fold a batch of values into the estimate."""
+        for value in values:
+            self.add(value)
+
+    def value(self):
+        """Current estimate, or None if no values were seen."""
+        q = self._heights
+        if not q:
+            return None
+        if len(q) < 5 or self._positions[4] < 4:
+            return q[min(int(self.p * len(q)), len(q) - 1)]
+        return q[2]
+
+
+def summarize(batches, quantiles=(0.5, 0.9, 0.99)):
+    """
+    Compute RunningStats and approximate quantiles over batches in one pass.
+
+    Args:
+        batches (iterable): lists of numeric values, e.g. from fetchmany
+        quantiles (tuple of float): quantiles to estimate
+
+    Returns:
+        dict: RunningStats.as_dict() plus a "quantiles" mapping
+    """
+    stats = RunningStats()
+    estimators = [P2Quantile(p) for p in quantiles]
+    for batch in batches:
+        stats.update(batch)
+        for estimator in estimators:
+            estimator.update(batch)
+    result = stats.as_dict()
+    result["quantiles"] = {e.p: e.value() for e in estimators}
+    return result
+
+
+# Aggregates SQLite evaluates natively, and their SQL spelling
+PUSHDOWN_FUNCTIONS = {
+    "count": "COUNT",
+    "sum": "SUM",
+    "avg": "AVG",
+    "mean": "AVG",
+    "min": "MIN",
+    "max": "MAX",
+}
+# Aggregates that are only available client-side (plus "pNN" quantiles)
+STREAM_FUNCTIONS = ("variance", "stddev", "median")
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_QUANTILE = re.compile(r"^p(\d{1,2}(?:\.\d+)?)$")
+
+
+def _identifier(name):
+    """Validate a table or column name before it is put into SQL."""
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid SQL identifier: {name!r}")
+    return name
+
+
+class _StreamAggregate:
+    """Client-side accumulator for one aggregate (one group)."""
+
+    def __init__(self, func):
+        self.func = func
+        self.stats = RunningStats()
+        quantile = _QUANTILE.match(func)
+        if func == "median":
+            self.quantile = P2Quantile(0.5)
+        elif quantile:
+            self.quantile = P2Quantile(float(quantile.group(1)) / 100)
+        else:
+            self.quantile = None
+
+    def add(self, value):
+        if value is None:  # NULLs are ignored, as in SQL aggregates
+            return
+        if self.quantile is not None:
+            self.quantile.add(value)
+        else:
+            self.stats.add(value)
+
+    def result(self):
+        if self.quantile is not None:
+            return self.quantile.value()
+        if self.func == "count":
+            return self.stats.count
+        if self.stats.count == 0:
+            return None
+        return {
+            "sum": self.stats.total,
+            "avg": self.stats.mean,
+            "mean": self.stats.mean,
+            "min": self.stats.min,
+            "max": self.stats.max,
+            "variance": self.stats.variance,
+            "stddev": self.stats.stddev,
+        }[self.func]
+
+
+class AggregatePlan:
+    """
+    Decide where an aggregate over a SQLite table is computed, and run it.
+
+    A plain column with a COUNT/SUM/AVG/MIN/MAX aggregate is pushed down to
+    SQLite, which returns a single row (per group) instead of every value.
+    Anything SQLite cannot express -- variance, stddev, median and pNN
+    quantiles, or a Python callable computing the value from each row --
+    is streamed with fetchmany and aggregated client-side in one pass.
+
+    Args:
+        func (str): count, sum, avg/mean, min, max, variance, stddev,
+            median or pNN (e.g. "p90")
+        column (str or callable): column name, or a callable taking a
+            sqlite3.Row and returning the value to aggregate
+        table (str): table name
+        group_by (str): optional column to group by
+    """
+
+    def __init__(self, func, column, table, group_by=None):
+        func = func.lower()
+        quantile = _QUANTILE.match(func)
+        if func not in PUSHDOWN_FUNCTIONS and func not in STREAM_FUNCTIONS \
+                and not quantile:
+            raise ValueError(f"Unsupported aggregate: {func!r}")
+        if quantile and not 0 < float(quantile.group(1)) < 100:
+            raise ValueError(f"Quantile must be in (0, 100): {func!r}")
+        self.func = func
+        self.column = column if callable(column) else _identifier(column)
+        self.table = _identifier(table)
+        self.group_by = _identifier(group_by) if group_by else None
+        self.pushdown = func in PUSHDOWN_FUNCTIONS and not callable(column)
+        self.sql = self._pushdown_sql() if self.pushdown else self._stream_sql()
+
+    def _pushdown_sql(self):
+        expr = f"{PUSHDOWN_FUNCTIONS[self.func]}({self.column})"
+        if self.group_by:
+            return (f"SELECT {self.group_by}, {expr} FROM {self.table} "
+                    f"GROUP BY {self.group_by}")
+        return f"SELECT {expr} FROM {self.table}"
+
+    def _stream_sql(self):
+        if callable(self.column):
+            return f"SELECT * FROM {self.table}"
+        if self.group_by:
+            return f"SELECT {self.group_by}, {self.column} FROM {self.table}"
+        return f"SELECT {self.column} FROM {self.table}"
+
+    def explain(self):
+        """Describe the chosen execution path."""
+        if self.pushdown:
+            return f"PUSHDOWN {self.func} to SQLite: {self.sql}"
+        what = getattr(self.column, "__name__", "expression") \
+            if callable(self.column) else self.column
+        grouped = f" per {self.group_by}" if self.group_by else ""
+        return (f"STREAM {self.func}({what}){grouped} client-side "
+                f"in one pass over: {self.sql}")
+
+    def execute(self, conn, batch_size=1000):
+        """
+        Run the plan on an open sqlite3 connection.
+
+        Returns:
+            the aggregate value, or {group: value} when grouped
+        """
+        if self.pushdown:
+            rows = conn.execute(self.sql).fetchall()
+            if self.group_by:
+                return dict(rows)
+            return rows[0][0]
+
+        cursor = conn.cursor()
+        if callable(self.column):
+            cursor.row_factory = sqlite3.Row
+        cursor.execute(self.sql)
+        if callable(self.column):
+            value_of = self.column
+            key_of = (lambda row: row[self.group_by]) if self.group_by \
+                else (lambda row: None)
+        else:
+            value_of = (lambda row: row[-1])
+            key_of = (lambda row: row[0]) if self.group_by \
+                else (lambda row: None)
+
+        groups = {}
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                key = key_of(row)
+                value = value_of(row)
+                accumulator = groups.get(key)
+                if accumulator is None:
+                    accumulator = groups[key] = _StreamAggregate(self.func)
+                accumulator.add(value)
+        if self.group_by:
+            return {key: acc.result() for key, acc in groups.items()}
+        accumulator = groups.get(None) or _StreamAggregate(self.func)
+        return accumulator.result()
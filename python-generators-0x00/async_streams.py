@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Asynchronous counterparts of the python-generators-0x00 pipelines.
+
+Each function is an async generator for use with `async for`, so many
+streams can share one event loop. MySQL streams use aiomysql with
+server-side cursors; the users.db age streams use aiosqlite.
+
+- async_stream_users(): rows of user_data one by one
+- async_stream_users_in_batches(batch_size, prefetch): rows in batches
+- async_lazy_pagination(page_size, cursor): keyset pages of user_data
+- async_stream_user_ages(): ages from users.db one by one
+- async_read_ahead(batches, depth): fetch batches ahead on a task
+"""
+
+import asyncio
+from contextlib import suppress
+
+import aiomysql
+import aiosqlite
+
+lazy_paginate = __import__('2-lazy_paginate')
+
+
+_DONE = object()
+
+
+class _Failure:
+    """Carries an exception from the read-ahead task to the consumer."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _connect_prodev():
+    """Open an aiomysql connection to the ALX_prodev database."""
+    return aiomysql.connect(
+        host="localhost",
+        user="root",
+        password="your_password",  # Replace with your MySQL password
+        db="ALX_prodev"
+    )
+
+
+async def async_read_ahead(batches, depth):
+    """
+    Async generator that keeps up to `depth` batches fetched ahead.
+
+    A task drains `batches` into a bounded asyncio.Queue, so fetching the
+    next batch overlaps with the consumer awaiting on other work, and a full
+    queue suspends the producer (backpressure). Errors are re-raised in the
+    consumer; closing this generator cancels the task and closes `batches`.
+
+    Args:
+        batches (async iterable): source of batches
+        depth (int): maximum number of batches queued ahead
+
+    Yields:
+        the items of `batches`, in order
+    """
+    pending = asyncio.Queue(maxsize=depth)
+
+    async def produce():
+        try:
+            async for batch in batches:
+                await pending.put(batch)
+            await pending.put(_DONE)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:  # handed over to the consumer
+            await pending.put(_Failure(e))
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            item = await pending.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        producer.cancel()
+        with suppress(asyncio.CancelledError):
+            await producer
+        aclose = getattr(batches, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+async def async_stream_users(fetch_size=1000):
+    """
+    Async generator streaming user_data rows one by one as dicts.
+
+    Uses a server-side (unbuffered) cursor, reading fetch_size rows per
+    round trip, so memory stays bounded regardless of table size.
+    """
+    async for batch in _fetch_batches(fetch_size):
+        for row in batch:
+            yield row
+
+
+async def _fetch_batches(batch_size):
+    """Fetch user_data `batch_size` rows at a time on one connection."""
+    connection = await _connect_prodev()
+    try:
+        async with connection.cursor(aiomysql.SSDictCursor) as cursor:
+            await cursor.execute("SELECT * FROM user_data")
+            while True:
+                batch = await cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield batch
+    finally:
+        connection.close()
+
+
+async def async_stream_users_in_batches(batch_size, prefetch=0):
+    """
+    Async generator yielding user_data rows in lists of batch_size.
+
+    Args:
+        batch_size (int): number of rows per batch
+        prefetch (int): if > 0, keep this many batches fetched ahead
+            (see async_read_ahead)
+    """
+    batches = _fetch_batches(batch_size)
+    if prefetch > 0:
+        batches = async_read_ahead(batches, prefetch)
+    try:
+        async for batch in batches:
+            yield batch
+    finally:
+        await batches.aclose()
+
+
+async def async_lazy_pagination(page_size, cursor=None):
+    """
+    Async generator yielding keyset pages of user_data over one connection.
+
+    Args:
+        page_size (int): number of rows per page
+        cursor (str): token from page_cursor() to resume after that page
+    """
+    last_user_id = lazy_paginate.decode_cursor(cursor) \
+        if cursor is not None else None
+    connection = await _connect_prodev()
+    try:
+        async with connection.cursor(aiomysql.DictCursor) as db_cursor:
+            while True:
+                if last_user_id is None:
+                    await db_cursor.execute(lazy_paginate.FIRST_PAGE_QUERY,
+                                            (page_size,))
+                else:
+                    await db_cursor.execute(lazy_paginate.KEYSET_QUERY,
+                                            (last_user_id, page_size))
+                page = await db_cursor.fetchall()
+                if not page:
+                    break
+                yield list(page)
+                last_user_id = page[-1]["user_id"]
+    finally:
+        connection.close()
+
+
+async def async_stream_user_age_batches(batch_size=1000, database="users.db"):
+    """Async generator yielding user ages in lists of up to batch_size."""
+    async with aiosqlite.connect(database) as db:
+        async with db.execute("SELECT age FROM users") as cursor:
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [row[0] for row in rows]
+
+
+async def async_stream_user_ages(batch_size=1000, database="users.db"):
+    """Async generator yielding user ages one by one."""
+    async for ages in async_stream_user_age_batches(batch_size, database):
+        for age in ages:
+            yield age
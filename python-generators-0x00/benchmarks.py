@@ -0,0 +1,385 @@
+#!/usr/bin/python3
+"""
+Benchmarks for the python-generators-0x00 pipelines.
+
+Run against a seeded ALX_prodev database, e.g.:
+
+    ./benchmarks.py pagination
+
+The async, columnar and snapshot benchmarks import their modules (and
+with them aiomysql/aiosqlite or numpy) only when they run.
+"""
+
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import seed
+from aggregates import AggregatePlan
+
+stream_users = __import__('0-stream_users')
+stream_ages = __import__('4-stream_ages')
+batch_processing = __import__('1-batch_processing')
+lazy_paginate = __import__('2-lazy_paginate')
+
+
+def _timed(func, *args, **kwargs):
+    """Return (seconds, result) for a single call."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def _user_id_at(offset):
+    """Return the user_id of the row just before `offset` in key order."""
+    connection = seed.connect_to_prodev()
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT user_id FROM user_data ORDER BY user_id LIMIT 1 OFFSET %s",
+        (offset - 1,)
+    )
+    row = cursor.fetchone()
+    cursor.close()
+    connection.close()
+    return row[0] if row else None
+
+
+def bench_pagination(page_size=100, offsets=(0, 10000, 100000, 1000000)):
+    """Compare the cost of one page at growing depths: OFFSET vs keyset."""
+    print(f"{'offset':>10} {'offset (ms)':>12} {'keyset (ms)':>12}")
+    for offset in offsets:
+        last_user_id = _user_id_at(offset) if offset else None
+        if offset and last_user_id is None:
+            print(f"{offset:>10} {'(table too small)':>25}")
+            continue
+        offset_s, _ = _timed(lazy_paginate.paginate_users, page_size, offset)
+        keyset_s, _ = _timed(
+            lazy_paginate.paginate_users_after, page_size, last_user_id
+        )
+        print(f"{offset:>10} {offset_s * 1000:>12.2f} {keyset_s * 1000:>12.2f}")
+
+
+def bench_page_session(page_size=100, pages=200):
+    """Per-page latency of a keyset sweep: connection per page vs session."""
+    def sweep(session):
+        last_user_id = None
+        for _ in range(pages):
+            page = lazy_paginate.paginate_users_after(
+                page_size, last_user_id, session
+            )
+            if not page:
+                break
+            last_user_id = page[-1]["user_id"]
+
+    per_page_s, _ = _timed(sweep, None)
+    with lazy_paginate.PageSession() as session:
+        session_s, _ = _timed(sweep, session)
+    print(f"connection per page: {per_page_s / pages * 1000:.3f} ms/page")
+    print(f"shared session:      {session_s / pages * 1000:.3f} ms/page")
+
+
+def bench_stream_memory(modes=(
+        (False, "dict"), (True, "dict"), (True, "tuple"), (True, "row"))):
+    """tracemalloc peak and wall time of a full stream_users scan per mode."""
+    print(f"{'mode':>16} {'rows':>10} {'peak (KiB)':>12} {'seconds':>9}")
+    for streaming, row_type in modes:
+        tracemalloc.start()
+        start = time.perf_counter()
+        count = 0
+        for _ in stream_users.stream_users(streaming, row_type):
+            count += 1
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        label = f"{'stream' if streaming else 'default'}/{row_type}"
+        print(f"{label:>16} {count:>10} {peak / 1024:>12.1f} {elapsed:>9.2f}")
+
+
+def _synthetic_batches(count, fetch_s):
+    """Yield `count` dummy batches, sleeping `fetch_s` to mimic DB I/O."""
+    for i in range(count):
+        time.sleep(fetch_s)
+        yield [i]
+
+
+def bench_read_ahead(batches=50, depths=(0, 1, 4)):
+    """Batches/sec with and without read-ahead for slow DB vs slow consumer."""
+    scenarios = (
+        ("slow db", 0.010, 0.002),
+        ("slow consumer", 0.002, 0.010),
+        ("balanced", 0.005, 0.005),
+    )
+    print(f"{'scenario':>14} {'depth':>6} {'batches/s':>10}")
+    for label, fetch_s, consume_s in scenarios:
+        for depth in depths:
+            source = _synthetic_batches(batches, fetch_s)
+            if depth:
+                source = batch_processing.read_ahead(source, depth)
+            start = time.perf_counter()
+            for _ in source:
+                time.sleep(consume_s)
+            rate = batches / (time.perf_counter() - start)
+            print(f"{label:>14} {depth:>6} {rate:>10.1f}")
+
+
+def bench_seed(csv_file="user_data.csv", chunk_sizes=(500, 5000)):
+    """Rows/sec of the per-row, executemany and LOAD DATA seeding paths.
+
+    Loads into a scratch copy of user_data that is dropped afterwards.
+    """
+    connection = seed.connect_to_prodev(allow_local_infile=True)
+    cursor = connection.cursor()
+
+    def fresh_table():
+        cursor.execute("DROP TABLE IF EXISTS user_data_bench")
+        cursor.execute("CREATE TABLE user_data_bench LIKE user_data")
+
+    runs = [("per-row", lambda: seed.insert_data(
+        connection, csv_file, table="user_data_bench"))]
+    for size in chunk_sizes:
+        runs.append((f"executemany/{size}", lambda size=size:
+                     seed.insert_data_bulk(connection, csv_file, size,
+                                           report=False,
+                                           table="user_data_bench")))
+    runs.append(("load data", lambda: seed.load_data_infile(
+        connection, csv_file, table="user_data_bench")))
+
+    results = []
+    try:
+        for label, run in runs:
+            fresh_table()
+            seconds, _ = _timed(run)
+            cursor.execute("SELECT COUNT(*) FROM user_data_bench")
+            (rows,) = cursor.fetchone()
+            results.append((label, rows, seconds))
+    finally:
+        cursor.execute("DROP TABLE IF EXISTS user_data_bench")
+        cursor.close()
+        connection.close()
+
+    print(f"{'method':>18} {'rows':>10} {'rows/s':>12}")
+    for label, rows, seconds in results:
+        print(f"{label:>18} {rows:>10} {rows / seconds:>12,.0f}")
+
+
+def bench_parallel_seed(csv_file="user_data.csv", workers=(1, 2, 4, 8)):
+    """Rows/sec of insert_data_parallel from 1 to N worker processes."""
+    connection = seed.connect_to_prodev()
+    cursor = connection.cursor()
+    print(f"{'workers':>8} {'rows/s':>12} {'speedup':>8}")
+    baseline = None
+    try:
+        for count in workers:
+            cursor.execute("DROP TABLE IF EXISTS user_data_bench")
+            cursor.execute("CREATE TABLE user_data_bench LIKE user_data")
+            seconds, rows = _timed(seed.insert_data_parallel, csv_file,
+                                   count, table="user_data_bench")
+            rate = rows / seconds
+            baseline = baseline or rate
+            print(f"{count:>8} {rate:>12,.0f} {rate / baseline:>7.2f}x")
+    finally:
+        cursor.execute("DROP TABLE IF EXISTS user_data_bench")
+        cursor.close()
+        connection.close()
+
+
+def make_users_db(path, rows, chunk=100000):
+    """Create a SQLite users table with `rows` random ages at `path`."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, "
+                 "email TEXT, age INTEGER)")
+    rng = random.Random(0)
+    for start in range(0, rows, chunk):
+        conn.executemany(
+            "INSERT INTO users (name, email, age) VALUES (?, ?, ?)",
+            ((f"user{i}", f"user{i}@example.com", rng.randint(18, 90))
+             for i in range(start, min(start + chunk, rows)))
+        )
+    conn.commit()
+    conn.close()
+
+
+def bench_age_planner(rows=10000000):
+    """Pushdown vs client-side streaming of age aggregates on users.db."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "users.db")
+        make_users_db(path, rows)
+        conn = sqlite3.connect(path)
+        cases = (
+            ("avg", "age", None),
+            ("avg", lambda row: row["age"], None),
+            ("count", "age", "age"),
+            ("variance", "age", None),
+            ("p90", "age", None),
+        )
+        print(f"{'rows':>10} {'seconds':>9}  plan")
+        for func, column, group_by in cases:
+            plan = AggregatePlan(func, column, "users", group_by)
+            seconds, _ = _timed(plan.execute, conn)
+            print(f"{rows:>10} {seconds:>9.3f}  {plan.explain()}")
+        conn.close()
+
+
+def bench_columnar(rows=1000000, batch_size=10000):
+    """Per-row Python vs NumPy filter and mean over in-memory batches.
+
+    Uses synthetic batches so only the consumer side is measured. The
+    "numpy" column includes converting each batch to arrays; "reused"
+    times the same reduction over arrays that already exist.
+    """
+    import columnar
+    columnar._require_numpy()
+    np = columnar.np
+    rng = random.Random(0)
+    users = [{"user_id": f"{i:036d}", "age": rng.randint(18, 90)}
+             for i in range(rows)]
+    batches = [users[i:i + batch_size] for i in range(0, rows, batch_size)]
+    ages = [[user["age"] for user in batch] for batch in batches]
+    converted = [columnar.batch_to_columns(b, ("age",)) for b in batches]
+    predicate = [("age", ">", 25)]
+
+    def python_filter():
+        return sum(1 for batch in batches for user in batch
+                   if int(user["age"]) > 25)
+
+    def numpy_filter():
+        return sum(int(columnar.column_mask(
+            columnar.batch_to_columns(b, ("age",)), predicate).sum())
+            for b in batches)
+
+    def reused_filter():
+        return sum(int(columnar.column_mask(c, predicate).sum())
+                   for c in converted)
+
+    def python_mean():
+        total = count = 0
+        for batch in ages:
+            for age in batch:
+                total += age
+                count += 1
+        return total / count
+
+    def numpy_mean():
+        total = count = 0
+        for batch in ages:
+            array = np.fromiter(batch, dtype=np.float64, count=len(batch))
+            total += float(array.sum())
+            count += array.size
+        return total / count
+
+    def reused_mean():
+        return (sum(float(c["age"].sum()) for c in converted)
+                / sum(c["age"].size for c in converted))
+
+    print(f"{'operation':>10} {'python (s)':>10} {'numpy (s)':>10} "
+          f"{'reused (s)':>10}")
+    for label, runs in (
+            ("age > 25", (python_filter, numpy_filter, reused_filter)),
+            ("mean age", (python_mean, numpy_mean, reused_mean))):
+        timings = [_timed(run) for run in runs]
+        results = [result for _, result in timings]
+        assert max(results) - min(results) < 1e-6, results
+        print(f"{label:>10} " + " ".join(
+            f"{seconds:>10.3f}" for seconds, _ in timings))
+
+
+def bench_async_streams(rows=50000, streams=(1, 10, 50), io_s=0.002):
+    """Wall time of N age streams: sequential blocking vs one event loop.
+
+    Each batch is followed by `io_s` of simulated downstream I/O (e.g.
+    forwarding it to another service): time.sleep in the blocking run,
+    asyncio.sleep in the async one, where it overlaps across streams.
+    """
+    import async_streams
+
+    def consume_blocking(path):
+        total = 0
+        for ages in stream_ages.stream_user_age_batches(1000, path):
+            total += sum(ages)
+            time.sleep(io_s)
+        return total
+
+    async def consume(path):
+        total = 0
+        async for ages in async_streams.async_stream_user_age_batches(
+                1000, path):
+            total += sum(ages)
+            await asyncio.sleep(io_s)
+        return total
+
+    async def run_all(count, path):
+        return await asyncio.gather(*(consume(path) for _ in range(count)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "users.db")
+        make_users_db(path, rows)
+        print(f"{'streams':>8} {'blocking (s)':>13} {'asyncio (s)':>12}")
+        for count in streams:
+            blocking_s, _ = _timed(
+                lambda: [consume_blocking(path) for _ in range(count)])
+            async_s, _ = _timed(asyncio.run, run_all(count, path))
+            print(f"{count:>8} {blocking_s:>13.3f} {async_s:>12.3f}")
+
+
+def bench_snapshot(rows=1000000, repeats=5):
+    """Repeated age aggregates: live users.db scans vs a mapped snapshot."""
+    import snapshot
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "users.db")
+        snapshot_dir = os.path.join(tmp, "snapshot")
+        make_users_db(path, rows)
+        export_s, _ = _timed(snapshot.snapshot_users_db, snapshot_dir, path)
+        snap = snapshot.Snapshot(snapshot_dir)
+
+        def live():
+            for _ in range(repeats):
+                stream_ages.age_statistics(10000, (), path)
+                stream_ages.aggregate_ages("avg", database=path)
+
+        def mapped():
+            for _ in range(repeats):
+                snap.mean("age")
+                snap.count_where("age", ">", 25)
+
+        live_s, _ = _timed(live)
+        mapped_s, _ = _timed(mapped)
+        conn = sqlite3.connect(path)
+        make_rows = [(f"new{i}", f"new{i}@example.com", 30)
+                     for i in range(rows // 100)]
+        conn.executemany("INSERT INTO users (name, email, age) "
+                         "VALUES (?, ?, ?)", make_rows)
+        conn.commit()
+        conn.close()
+        refresh_s, added = _timed(snapshot.snapshot_users_db,
+                                  snapshot_dir, path)
+        print(f"export {rows} rows:        {export_s:.3f}s")
+        print(f"{repeats}x live aggregates:    {live_s:.3f}s")
+        print(f"{repeats}x snapshot aggregates: {mapped_s:.3f}s")
+        print(f"refresh (+{added} rows):   {refresh_s:.3f}s")
+
+
+BENCHMARKS = {
+    "pagination": bench_pagination,
+    "page_session": bench_page_session,
+    "stream_memory": bench_stream_memory,
+    "read_ahead": bench_read_ahead,
+    "seed": bench_seed,
+    "parallel_seed": bench_parallel_seed,
+    "age_planner": bench_age_planner,
+    "columnar": bench_columnar,
+    "async_streams": bench_async_streams,
+    "snapshot": bench_snapshot,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"== {name}")
+        BENCHMARKS[name]()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Optional NumPy columnar path for the generator pipelines.
+
+Each fetched batch is converted once into column arrays (age as float64,
+user_id as fixed-width bytes) so filters and reductions run vectorized
+instead of one Python object at a time. Requires numpy.
+
+- batch_to_columns(batch): dict rows -> {"user_id": S36 array, "age": float64 array}
+- columnar_batch_processing(batch_size): users over age 25, filtered in NumPy
+- columnar_average_age(batch_size): mean age from ages in NumPy batches
+"""
+
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:  # numpy is an optional dependency
+    np = None
+
+batch_processing = __import__('1-batch_processing')
+stream_ages = __import__('4-stream_ages')
+
+_DTYPES = {
+    "user_id": "S36",
+    "age": "float64",
+}
+
+_COMPARISONS = {
+    "=": "__eq__",
+    "!=": "__ne__",
+    "<": "__lt__",
+    "<=": "__le__",
+    ">": "__gt__",
+    ">=": "__ge__",
+}
+
+
+def _require_numpy():
+    """Raise a helpful error when the columnar path is used without numpy."""
+    if np is None:
+        raise ImportError("The columnar path requires numpy: pip install numpy")
+
+
+def batch_to_columns(batch, columns=("user_id", "age")):
+    """
+    Convert a batch of user_data dict rows into column arrays.
+
+    Only the requested columns are converted, since building the arrays
+    is the per-row part of the columnar path.
+
+    Args:
+        batch (list of dict): rows as yielded by stream_users_in_batches
+        columns (tuple of str): any of "user_id" and "age"
+
+    Returns:
+        dict: {"user_id": bytes array (S36), "age": float64 array}
+    """
+    _require_numpy()
+    count = len(batch)
+    return {
+        column: np.fromiter(map(itemgetter(column), batch),
+                            dtype=_DTYPES[column], count=count)
+        for column in columns
+    }
+
+
+def column_mask(columns, predicates):
+    """
+    Evaluate (column, operator, value) comparisons over column arrays.
+
+    Returns:
+        numpy bool array selecting the rows that satisfy every predicate
+    """
+    _require_numpy()
+    mask = None
+    for column, op, value in predicates:
+        if op not in _COMPARISONS:
+            raise ValueError(f"Unsupported operator: {op!r}")
+        selected = getattr(columns[column], _COMPARISONS[op])(value)
+        mask = selected if mask is None else mask & selected
+    return mask
+
+
+def columnar_batch_processing(batch_size, prefetch=0):
+    """
+    Generator that yields users over age 25, filtering each whole batch
+    with one vectorized comparison instead of a per-row Python test.
+
+    Args:
+        batch_size (int): number of rows per batch
+        prefetch (int): batches to fetch ahead of processing (0 disables)
+
+    Yields:
+        dict: user row where age > 25
+    """
+    for batch in batch_processing.stream_users_in_batches(batch_size,
+                                                          prefetch):
+        columns = batch_to_columns(batch, ("age",))
+        mask = column_mask(columns, [("age", ">", 25)])
+        for index in np.flatnonzero(mask):
+            yield batch[index]
+
+
+def columnar_average_age(batch_size=10000, database="users.db"):
+    """
+    Mean user age, reducing each fetched batch with NumPy.
+
+    Returns:
+        float: the average age, or None for an empty table
+    """
+    _require_numpy()
+    total = 0.0
+    count = 0
+    for ages in stream_ages.stream_user_age_batches(batch_size, database):
+        array = np.fromiter(ages, dtype=np.float64, count=len(ages))
+        total += float(array.sum())
+        count += array.size
+    return total / count if count else None
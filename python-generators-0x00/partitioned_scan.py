@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+"""
+Parallel range-partitioned scan of the user_data table.
+
+The user_id key space is split at sampled boundaries into disjoint
+ranges; each range is read on its own connection by a worker thread or
+process, and the batches are merged either as they arrive (unordered,
+maximum throughput) or in user_id order.
+
+- sample_boundaries(connection, partitions): split points on user_id
+- key_ranges(boundaries): half-open (low, high) user_id ranges
+- partitioned_scan(partitions, batch_size, ordered, executor): batches
+"""
+
+import multiprocessing
+import queue
+import threading
+
+import seed
+
+
+def sample_boundaries(connection, partitions):
+    """
+    Pick up to partitions - 1 user_id values splitting the table evenly.
+
+    Each boundary is read from the primary key index with LIMIT 1 OFFSET k,
+    which walks k index entries rather than seeking: sampling costs about
+    one pass over the index, still far less than reading the rows.
+
+    Returns:
+        list of str: sorted, distinct boundary keys
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM user_data")
+        (count,) = cursor.fetchone()
+        boundaries = []
+        for i in range(1, partitions):
+            cursor.execute(
+                "SELECT user_id FROM user_data ORDER BY user_id "
+                "LIMIT 1 OFFSET %s",
+                (count * i // partitions,)
+            )
+            row = cursor.fetchone()
+            if row and (not boundaries or row[0] > boundaries[-1]):
+                boundaries.append(row[0])
+        return boundaries
+    finally:
+        cursor.close()
+
+
+def key_ranges(boundaries):
+    """
+    Turn sorted boundaries into half-open (low, high) ranges covering every
+    key; None means unbounded on that side.
+    """
+    edges = [None] + list(boundaries) + [None]
+    return list(zip(edges, edges[1:]))
+
+
+def _range_query(low, high):
+    """SQL and parameters selecting the rows in [low, high) in key order."""
+    clauses = []
+    params = []
+    if low is not None:
+        clauses.append("user_id >= %s")
+        params.append(low)
+    if high is not None:
+        clauses.append("user_id < %s")
+        params.append(high)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return f"SELECT * FROM user_data{where} ORDER BY user_id", tuple(params)
+
+
+def _put(out, item, stop):
+    """Put onto a bounded queue, giving up once `stop` is set."""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _scan_worker(tag, low, high, batch_size, out, stop):
+    """Read one key range on its own connection and queue its batches."""
+    connection = None
+    cursor = None
+    try:
+        # consume_results lets close() discard rows left unread after a stop
+        connection = seed.connect_to_prodev(consume_results=True)
+        if connection is None:
+            raise ConnectionError("Could not connect to ALX_prodev")
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(*_range_query(low, high))
+        while not stop.is_set():
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            if not _put(out, (tag, "batch", batch), stop):
+                return
+        _put(out, (tag, "done", None), stop)
+    except Exception as e:  # handed over to the consumer
+        _put(out, (tag, "error", e), stop)
+    finally:
+        if stop.is_set() and hasattr(out, "cancel_join_thread"):
+            # Abandoned by the consumer: let the process exit without
+            # flushing batches nobody will read, even if closing fails
+            out.cancel_join_thread()
+        try:
+            if cursor:
+                cursor.close()
+        finally:
+            if connection and connection.is_connected():
+                connection.close()
+
+
+def partitioned_scan(partitions=4, batch_size=1000, ordered=False,
+                     executor="thread", depth=4):
+    """
+    Generator that scans user_data with one connection per key range.
+
+    Args:
+        partitions (int): number of key ranges (and workers)
+        batch_size (int): rows per fetched batch
+        ordered (bool): yield batches in user_id order instead of as soon as
+            any worker delivers one. Ranges are disjoint and sorted, so the
+            k-way merge reduces to draining the per-range queues in turn
+            while later ranges keep fetching in the background.
+        executor (str): "thread" or "process" workers
+        depth (int): batches each worker may queue ahead of the consumer
+
+    Yields:
+        list of dict: batches of user rows
+    """
+    if executor not in ("thread", "process"):
+        raise ValueError(f"executor must be 'thread' or 'process', "
+                         f"got {executor!r}")
+
+    connection = seed.connect_to_prodev()
+    try:
+        ranges = key_ranges(sample_boundaries(connection, partitions))
+    finally:
+        connection.close()
+
+    if executor == "process":
+        context = multiprocessing.get_context()
+        make_queue, stop, worker_type = context.Queue, context.Event(), \
+            context.Process
+    else:
+        make_queue, stop, worker_type = queue.Queue, threading.Event(), \
+            threading.Thread
+
+    if ordered:
+        queues = [make_queue(maxsize=depth) for _ in ranges]
+    else:
+        shared = make_queue(maxsize=depth * len(ranges))
+        queues = [shared] * len(ranges)
+
+    workers = [
+        worker_type(target=_scan_worker,
+                    args=(tag, low, high, batch_size, queues[tag], stop),
+                    daemon=True)
+        for tag, (low, high) in enumerate(ranges)
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        remaining = set(range(len(ranges)))
+        current = 0
+        while remaining:
+            source = queues[current] if ordered else queues[0]
+            tag, kind, payload = source.get()
+            if kind == "batch":
+                yield payload
+            elif kind == "error":
+                raise payload
+            else:
+                remaining.discard(tag)
+                current += 1
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
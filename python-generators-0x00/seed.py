@@ -7,7 +7,10 @@ creating user_data table, and inserting data from CSV.
 import mysql.connector
 from mysql.connector import Error
 import csv
-import uuid
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 
 def connect_db():
@@ -37,14 +40,20 @@ def create_database(connection):
         cursor.close()
 
 
-def connect_to_prodev():
-    """Connects to the ALX_prodev database."""
+def connect_to_prodev(allow_local_infile=False, **options):
+    """Connects to the ALX_prodev database.
+
+    Pass allow_local_infile=True for connections used by load_data_infile;
+    other options are passed on to mysql.connector.connect.
+    """
     try:
         connection = mysql.connector.connect(
             host="localhost",
             user="root",
             password="your_password",  # 🔴 Replace with your MySQL password
-            database="ALX_prodev"
+            database="ALX_prodev",
+            allow_local_infile=allow_local_infile,
+            **options
         )
         if connection.is_connected():
             return connection
@@ -63,7 +72,8 @@ def create_table(connection):
                 name VARCHAR(255) NOT NULL,
                 email VARCHAR(255) NOT NULL,
                 age DECIMAL NOT NULL,
-                INDEX(user_id)
+                INDEX(user_id),
+                INDEX idx_user_data_age (age)
             );
         """)
         connection.commit()
@@ -72,22 +82,58 @@ def create_table(connection):
         print(f"Error creating table: {e}")
     finally:
         cursor.close()
+    create_age_index(connection)
+
+
+def create_age_index(connection):
+    """Adds the age index to a user_data table created without it."""
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE()
+              AND table_name = 'user_data'
+              AND index_name = 'idx_user_data_age';
+        """)
+        (exists,) = cursor.fetchone()
+        if not exists:
+            cursor.execute(
+                "ALTER TABLE user_data ADD INDEX idx_user_data_age (age);"
+            )
+            connection.commit()
+            print("Index on user_data.age created successfully")
+    except Error as e:
+        print(f"Error creating age index: {e}")
+    finally:
+        cursor.close()
+
+
+def user_id_for(email):
+    """Derives a stable user_id from the email, so re-seeding dedupes.
+
+    Formats MD5(LOWER(TRIM(email))) as 8-4-4-4-12 hex, which is also what
+    load_data_infile computes server-side, so every loader agrees on the
+    key and INSERT IGNORE skips users that are already present.
+    """
+    digest = hashlib.md5(email.strip(" ").lower().encode("utf-8")).hexdigest()
+    return "-".join((digest[:8], digest[8:12], digest[12:16],
+                     digest[16:20], digest[20:]))
 
 
-def insert_data(connection, csv_file):
+def insert_data(connection, csv_file, table="user_data"):
     """Inserts data from CSV into the user_data table (skipping duplicates)."""
     try:
         cursor = connection.cursor()
         with open(csv_file, mode="r", encoding="utf-8") as file:
             reader = csv.DictReader(file)
             for row in reader:
-                user_id = str(uuid.uuid4())
+                user_id = user_id_for(row["email"])
                 name = row["name"]
                 email = row["email"]
                 age = row["age"]
 
-                cursor.execute("""
-                    INSERT IGNORE INTO user_data (user_id, name, email, age)
+                cursor.execute(f"""
+                    INSERT IGNORE INTO {table} (user_id, name, email, age)
                     VALUES (%s, %s, %s, %s);
                 """, (user_id, name, email, age))
         connection.commit()
@@ -96,3 +142,196 @@ def insert_data(connection, csv_file):
         print(f"Error inserting data: {e}")
     finally:
         cursor.close()
+
+
+def read_csv_chunks(csv_file, chunk_size):
+    """Yields lists of up to chunk_size (user_id, name, email, age) tuples."""
+    with open(csv_file, mode="r", encoding="utf-8", newline="") as file:
+        chunk = []
+        for row in csv.DictReader(file):
+            chunk.append(
+                (user_id_for(row["email"]), row["name"], row["email"],
+                 row["age"])
+            )
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _report_progress(label, rows, started):
+    """Prints rows loaded so far and the overall rows/sec."""
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed else 0.0
+    print(f"{label}: {rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+
+
+def insert_data_bulk(connection, csv_file, chunk_size=1000, report=True,
+                     table="user_data"):
+    """Streams the CSV in chunks into multi-row inserts (skipping duplicates).
+
+    Each chunk is sent as one multi-row INSERT IGNORE via executemany and
+    committed on its own, so memory stays bounded by chunk_size and a
+    failure only loses the chunk in flight. Returns the rows processed.
+    """
+    rows = 0
+    started = time.perf_counter()
+    cursor = connection.cursor()
+    try:
+        for chunk in read_csv_chunks(csv_file, chunk_size):
+            cursor.executemany(
+                f"INSERT IGNORE INTO {table} (user_id, name, email, age) "
+                "VALUES (%s, %s, %s, %s)",
+                chunk
+            )
+            connection.commit()
+            rows += len(chunk)
+            if report:
+                _report_progress("Inserted", rows, started)
+        print("Data inserted successfully")
+    except Error as e:
+        connection.rollback()
+        print(f"Error inserting data: {e}")
+    finally:
+        cursor.close()
+    return rows
+
+
+def load_data_infile(connection, csv_file, table="user_data"):
+    """Bulk-loads the CSV with LOAD DATA LOCAL INFILE (skipping duplicates).
+
+    The connection must be opened with connect_to_prodev(allow_local_infile=True)
+    and the server must have local_infile enabled. Returns the rows loaded.
+    """
+    with open(csv_file, mode="r", encoding="utf-8", newline="") as file:
+        header = next(csv.reader(file))
+    # Map CSV columns onto the table, discarding any we do not store
+    columns = ", ".join(
+        "@email" if name == "email"
+        else name if name in ("name", "age") else "@skip"
+        for name in header
+    )
+    digest = "MD5(LOWER(TRIM(@email)))"
+    rows = 0
+    started = time.perf_counter()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE {table}
+            FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+            LINES TERMINATED BY '\\n'
+            IGNORE 1 LINES
+            ({columns})
+            SET email = @email,
+                user_id = CONCAT_WS('-',
+                    SUBSTR({digest}, 1, 8), SUBSTR({digest}, 9, 4),
+                    SUBSTR({digest}, 13, 4), SUBSTR({digest}, 17, 4),
+                    SUBSTR({digest}, 21, 12));
+        """, (csv_file,))
+        connection.commit()
+        rows = cursor.rowcount
+        _report_progress("Loaded", rows, started)
+    except Error as e:
+        connection.rollback()
+        print(f"Error loading data: {e}")
+    finally:
+        cursor.close()
+    return rows
+
+
+def csv_shards(csv_file, shards):
+    """Splits the CSV body into up to `shards` line-aligned byte ranges.
+
+    Returns (header, ranges) where each range is a (start, end) byte
+    offset pair; every data line falls in exactly one range.
+    """
+    with open(csv_file, mode="rb") as file:
+        header_line = file.readline()
+        body_start = file.tell()
+        size = os.fstat(file.fileno()).st_size
+        bounds = [body_start]
+        for i in range(1, shards):
+            file.seek(body_start + (size - body_start) * i // shards)
+            file.readline()  # move to the start of the next full line
+            bounds.append(max(file.tell(), bounds[-1]))
+        bounds.append(size)
+    header = next(csv.reader([header_line.decode("utf-8")]))
+    ranges = [(start, end) for start, end in zip(bounds, bounds[1:])
+              if start < end]
+    return header, ranges
+
+
+def _read_shard_lines(csv_file, start, end):
+    """Yields the decoded CSV lines in the byte range [start, end)."""
+    with open(csv_file, mode="rb") as file:
+        file.seek(start)
+        position = start
+        while position < end:
+            line = file.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line.decode("utf-8")
+
+
+def _insert_shard(csv_file, header, start, end, chunk_size, table):
+    """Worker: parses one shard and inserts it over its own connection."""
+    connection = connect_to_prodev()
+    cursor = connection.cursor()
+    rows = 0
+    try:
+        chunk = []
+        reader = csv.DictReader(_read_shard_lines(csv_file, start, end),
+                                fieldnames=header)
+        for row in reader:
+            chunk.append((user_id_for(row["email"]), row["name"],
+                          row["email"], row["age"]))
+            if len(chunk) >= chunk_size:
+                rows += _insert_chunk(connection, cursor, chunk, table)
+                chunk = []
+        if chunk:
+            rows += _insert_chunk(connection, cursor, chunk, table)
+    finally:
+        cursor.close()
+        connection.close()
+    return rows
+
+
+def _insert_chunk(connection, cursor, chunk, table):
+    """Inserts and commits one chunk; returns its size."""
+    cursor.executemany(
+        f"INSERT IGNORE INTO {table} (user_id, name, email, age) "
+        "VALUES (%s, %s, %s, %s)",
+        chunk
+    )
+    connection.commit()
+    return len(chunk)
+
+
+def insert_data_parallel(csv_file, workers=4, chunk_size=1000,
+                         table="user_data"):
+    """Seeds the table from the CSV using `workers` processes.
+
+    The file is split into line-aligned byte ranges; each worker process
+    parses its range and inserts it over its own connection. Because
+    user_id is derived from the email (user_id_for), rows seen twice, in
+    the file or across runs, are skipped by INSERT IGNORE no matter which
+    worker inserts them first. Returns the rows processed.
+    """
+    header, ranges = csv_shards(csv_file, workers)
+    started = time.perf_counter()
+    rows = 0
+    try:
+        with ProcessPoolExecutor(max_workers=len(ranges) or 1) as pool:
+            futures = [
+                pool.submit(_insert_shard, csv_file, header, start, end,
+                            chunk_size, table)
+                for start, end in ranges
+            ]
+            for future in futures:
+                rows += future.result()
+        _report_progress(f"Inserted with {workers} workers", rows, started)
+    except Error as e:
+        print(f"Error inserting data: {e}")
+    return rows
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Columnar on-disk snapshots for repeated analytics without touching the DB.
+
+A snapshot is a directory holding meta.json plus one or more segments,
+each with one .npy file per column. Readers memory-map the files, so
+aggregations read straight from the page cache with no copies and no
+database load. Requires numpy.
+
+- snapshot_users_db(path, database): create or incrementally refresh a
+  snapshot of the SQLite users table (new rows by rowid watermark)
+- snapshot_user_data(path): full snapshot of the MySQL user_data table
+- Snapshot(path): memory-mapped reader with mean/count_where helpers
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+
+import columnar
+import seed
+
+META_FILE = "meta.json"
+USERS_DB_COLUMNS = {"id": "int64", "age": "float64"}
+USER_DATA_COLUMNS = {"user_id": "S36", "age": "float64"}
+
+
+def _read_meta(path):
+    """Load a snapshot's metadata, or None if there is no snapshot yet."""
+    try:
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def _write_meta(path, meta):
+    """Atomically replace the snapshot metadata."""
+    temporary = os.path.join(path, META_FILE + ".tmp")
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump(meta, file, indent=2)
+    os.replace(temporary, os.path.join(path, META_FILE))
+
+
+def _write_segment(path, name, columns, rows, batches):
+    """
+    Stream `rows` rows from `batches` (lists of tuples in column order)
+    into a new segment directory with one .npy file per column.
+
+    The files are written into a temporary directory that is renamed into
+    place only once complete, so a failed export leaves nothing behind
+    that a later snapshot would trip over.
+    """
+    np = columnar.np
+    segment = os.path.join(path, name)
+    temporary = segment + ".tmp"
+    # Leftovers of an interrupted export; neither is referenced by meta.json
+    for stale in (temporary, segment):
+        if os.path.exists(stale):
+            shutil.rmtree(stale)
+    os.makedirs(temporary)
+    try:
+        arrays = [
+            np.lib.format.open_memmap(
+                os.path.join(temporary, f"{column}.npy"),
+                mode="w+", dtype=dtype, shape=(rows,))
+            for column, dtype in columns.items()
+        ]
+        written = 0
+        for batch in batches:
+            end = written + len(batch)
+            for index, array in enumerate(arrays):
+                array[written:end] = [row[index] for row in batch]
+            written = end
+        for array in arrays:
+            array.flush()
+        del arrays
+        if written != rows:
+            raise RuntimeError(f"Expected {rows} rows for {segment}, "
+                               f"got {written}")
+    except BaseException:
+        shutil.rmtree(temporary, ignore_errors=True)
+        raise
+    os.replace(temporary, segment)
+    return {"name": name, "rows": rows}
+
+
+def _fetch_batches(cursor, batch_size):
+    """Yield fetchmany batches until the cursor is exhausted."""
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        yield batch
+
+
+def snapshot_users_db(path, database="users.db", batch_size=10000):
+    """
+    Create a snapshot of the users table, or append the rows added since
+    the last one as a new segment.
+
+    Rows are tracked by a rowid watermark, so only rows inserted after the
+    previous snapshot are read; updates and deletes of older rows are not
+    picked up (take a fresh snapshot in a new directory for those).
+
+    Returns:
+        int: number of rows added to the snapshot
+    """
+    columnar._require_numpy()
+    meta = _read_meta(path) or {"source": "users.db", "watermark": 0,
+                                "columns": USERS_DB_COLUMNS, "segments": []}
+    os.makedirs(path, exist_ok=True)
+    conn = sqlite3.connect(database)
+    try:
+        # One read transaction so the count and the scan see the same rows
+        conn.execute("BEGIN")
+        high, rows = conn.execute(
+            "SELECT MAX(rowid), COUNT(*) FROM users WHERE rowid > ?",
+            (meta["watermark"],)
+        ).fetchone()
+        if not rows:
+            return 0
+        cursor = conn.execute(
+            "SELECT id, age FROM users WHERE rowid > ? AND rowid <= ? "
+            "ORDER BY rowid",
+            (meta["watermark"], high)
+        )
+        name = f"segment-{len(meta['segments']):05d}"
+        meta["segments"].append(_write_segment(
+            path, name, meta["columns"], rows,
+            _fetch_batches(cursor, batch_size)
+        ))
+        meta["watermark"] = high
+        _write_meta(path, meta)
+        return rows
+    finally:
+        conn.close()
+
+
+def snapshot_user_data(path, batch_size=10000):
+    """
+    Take a full snapshot of the MySQL user_data table, replacing any
+    snapshot already at `path`.
+
+    user_data has no insertion-ordered column (user_id is a hash), so
+    there is no watermark to refresh from; re-run this for new data.
+
+    Returns:
+        int: number of rows in the snapshot
+    """
+    columnar._require_numpy()
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    connection = seed.connect_to_prodev()
+    cursor = connection.cursor()
+    try:
+        # Count and scan inside one consistent InnoDB snapshot
+        cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+        cursor.execute("SELECT COUNT(*) FROM user_data")
+        (rows,) = cursor.fetchone()
+        cursor.execute("SELECT user_id, age FROM user_data")
+        segment = _write_segment(path, "segment-00000", USER_DATA_COLUMNS,
+                                 rows, _fetch_batches(cursor, batch_size))
+        connection.commit()
+        _write_meta(path, {"source": "user_data", "watermark": None,
+                           "columns": USER_DATA_COLUMNS,
+                           "segments": [segment]})
+        return rows
+    finally:
+        cursor.close()
+        connection.close()
+
+
+class Snapshot:
+    """Memory-mapped reader for a snapshot directory."""
+
+    def __init__(self, path):
+        columnar._require_numpy()
+        self.path = path
+        self.meta = _read_meta(path)
+        if self.meta is None:
+            raise FileNotFoundError(f"No snapshot at {path!r}")
+
+    @property
+    def rows(self):
+        """Total rows across all segments."""
+        return sum(segment["rows"] for segment in self.meta["segments"])
+
+    def column(self, name):
+        """Return the column as a list of read-only memory-mapped arrays,
+        one per segment."""
+        if name not in self.meta["columns"]:
+            raise KeyError(name)
+        return [
+            columnar.np.load(
+                os.path.join(self.path, segment["name"], f"{name}.npy"),
+                mmap_mode="r"
+            )
+            for segment in self.meta["segments"]
+        ]
+
+    def mean(self, name):
+        """Mean of a numeric column, or None for an empty snapshot."""
+        arrays = self.column(name)
+        count = sum(array.size for array in arrays)
+        if not count:
+            return None
+        return sum(float(array.sum()) for array in arrays) / count
+
+    def count_where(self, name, op, value):
+        """Number of rows where `name op value` holds."""
+        return sum(
+            int(columnar.column_mask({name: array}, [(name, op, value)]).sum())
+            for array in self.column(name)
+        )
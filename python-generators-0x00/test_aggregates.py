@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the aggregates module.
+"""
+
+import random
+import sqlite3
+import statistics
+import unittest
+
+from aggregates import AggregatePlan, P2Quantile, RunningStats
+
+
+class TestRunningStats(unittest.TestCase):
+    """Test cases for RunningStats."""
+
+    def test_matches_statistics_module(self):
+        """Test that one pass agrees with the two-pass formulas."""
+        values = [random.Random(1).uniform(0, 100) for _ in range(1000)]
+        stats = RunningStats()
+        stats.update(values)
+        self.assertEqual(stats.count, 1000)
+        self.assertAlmostEqual(stats.mean, statistics.fmean(values))
+        self.assertAlmostEqual(stats.variance, statistics.pvariance(values))
+        self.assertAlmostEqual(stats.sample_variance,
+                               statistics.variance(values))
+        self.assertEqual(stats.min, min(values))
+        self.assertEqual(stats.max, max(values))
+
+    def test_merge_equals_single_pass(self):
+        """Test that merging two partial results equals one pass."""
+        rng = random.Random(2)
+        left = [rng.gauss(50, 10) for _ in range(700)]
+        right = [rng.gauss(80, 5) for _ in range(300)]
+        whole = RunningStats()
+        whole.update(left + right)
+        merged = RunningStats()
+        merged.update(left)
+        other = RunningStats()
+        other.update(right)
+        merged.merge(other)
+        self.assertEqual(merged.count, whole.count)
+        self.assertAlmostEqual(merged.total, whole.total)
+        self.assertAlmostEqual(merged.mean, whole.mean)
+        self.assertAlmostEqual(merged.variance, whole.variance)
+        self.assertEqual(merged.min, whole.min)
+        self.assertEqual(merged.max, whole.max)
+
+    def test_merge_with_empty(self):
+        """Test that merging into or from empty statistics is a no-op."""
+        stats = RunningStats()
+        stats.update([1, 2, 3])
+        stats.merge(RunningStats())
+        self.assertEqual(stats.count, 3)
+        empty = RunningStats().merge(stats)
+        self.assertEqual(empty.as_dict(), stats.as_dict())
+
+
+class TestP2Quantile(unittest.TestCase):
+    """Test cases for P2Quantile."""
+
+    def test_rejects_out_of_range(self):
+        """Test that p must lie strictly between 0 and 1."""
+        for p in (0, 1, -0.5, 1.5):
+            with self.assertRaises(ValueError):
+                P2Quantile(p)
+
+    def test_exact_for_few_values(self):
+        """Test that the estimate is exact for up to five values."""
+        estimator = P2Quantile(0.5)
+        self.assertIsNone(estimator.value())
+        estimator.update([5, 1, 3])
+        self.assertEqual(estimator.value(), 3)
+
+    def test_converges_on_uniform_stream(self):
+        """Test that estimates land near the true quantiles."""
+        rng = random.Random(3)
+        values = [rng.uniform(0, 1000) for _ in range(20000)]
+        ordered = sorted(values)
+        for p in (0.5, 0.9, 0.99):
+            estimator = P2Quantile(p)
+            estimator.update(values)
+            exact = ordered[int(p * len(ordered))]
+            self.assertAlmostEqual(estimator.value(), exact, delta=15)
+
+
+class TestAggregatePlan(unittest.TestCase):
+    """Test cases for AggregatePlan on SQLite."""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute(
+            "CREATE TABLE users (name TEXT, country TEXT, age INTEGER)")
+        rng = random.Random(4)
+        self.rows = [(f"user{i}", rng.choice(["ng", "gh"]),
+                      rng.randint(18, 90)) for i in range(2000)]
+        self.rows.append(("nobody", "ng", None))
+        self.conn.executemany("INSERT INTO users VALUES (?, ?, ?)",
+                              self.rows)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def ages(self, country=None):
+        return [age for _, c, age in self.rows
+                if age is not None and (country is None or c == country)]
+
+    def test_pushdown(self):
+        """Test that SQL-native aggregates run in SQLite."""
+        plan = AggregatePlan("avg", "age", "users")
+        self.assertTrue(plan.pushdown)
+        self.assertTrue(plan.explain().startswith("PUSHDOWN"))
+        self.assertAlmostEqual(plan.execute(self.conn),
+                               statistics.fmean(self.ages()))
+        self.assertEqual(AggregatePlan("count", "age", "users")
+                         .execute(self.conn), len(self.ages()))
+
+    def test_streaming(self):
+        """Test that client-side aggregates stream and skip NULLs."""
+        plan = AggregatePlan("variance", "age", "users")
+        self.assertFalse(plan.pushdown)
+        self.assertTrue(plan.explain().startswith("STREAM"))
+        self.assertAlmostEqual(plan.execute(self.conn, batch_size=64),
+                               statistics.pvariance(self.ages()))
+        median = AggregatePlan("median", "age", "users").execute(self.conn)
+        self.assertAlmostEqual(median, statistics.median(self.ages()),
+                               delta=2)
+
+    def test_callable_column_streams(self):
+        """Test that a callable column is evaluated per row client-side."""
+        plan = AggregatePlan("max", lambda row: len(row["name"]), "users")
+        self.assertFalse(plan.pushdown)
+        self.assertEqual(plan.execute(self.conn),
+                         max(len(name) for name, _, _ in self.rows))
+
+    def test_grouped(self):
+        """Test that grouped pushdown and streaming agree per group."""
+        pushed = AggregatePlan("sum", "age", "users", group_by="country")
+        streamed = AggregatePlan("p50", "age", "users", group_by="country")
+        sums = pushed.execute(self.conn)
+        medians = streamed.execute(self.conn)
+        for country in ("ng", "gh"):
+            self.assertEqual(sums[country], sum(self.ages(country)))
+            self.assertAlmostEqual(medians[country],
+                                   statistics.median(self.ages(country)),
+                                   delta=2)
+
+    def test_rejects_invalid(self):
+        """Test that bad aggregates and identifiers fail at construction."""
+        for func in ("p0", "p00", "p100", "mode"):
+            with self.assertRaises(ValueError):
+                AggregatePlan(func, "age", "users")
+        with self.assertRaises(ValueError):
+            AggregatePlan("sum", "age; DROP TABLE users", "users")
+
+
+if __name__ == "__main__":
+    unittest.main()
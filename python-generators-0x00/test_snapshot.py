@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the snapshot module.
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+try:
+    import snapshot
+    from columnar import np
+except ImportError:  # snapshot needs numpy and mysql-connector-python
+    snapshot = np = None
+
+
+def make_users_db(path, ages):
+    """Create a SQLite users table with one row per age."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS users "
+                 "(id INTEGER PRIMARY KEY, age INTEGER)")
+    conn.executemany("INSERT INTO users (age) VALUES (?)",
+                     [(age,) for age in ages])
+    conn.commit()
+    conn.close()
+
+
+@unittest.skipIf(snapshot is None or np is None,
+                 "snapshot dependencies are not installed")
+class TestSnapshot(unittest.TestCase):
+    """Test cases for snapshot_users_db and Snapshot."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.tmp.name, "users.db")
+        self.path = os.path.join(self.tmp.name, "snapshot")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_and_refresh(self):
+        """Test that a snapshot reads back and refreshes incrementally."""
+        make_users_db(self.database, [20, 30, 40])
+        self.assertEqual(
+            snapshot.snapshot_users_db(self.path, self.database, 2), 3)
+        reader = snapshot.Snapshot(self.path)
+        self.assertEqual(reader.rows, 3)
+        self.assertEqual(reader.mean("age"), 30.0)
+        self.assertEqual(reader.count_where("age", ">", 25), 2)
+
+        make_users_db(self.database, [50, 60])
+        self.assertEqual(
+            snapshot.snapshot_users_db(self.path, self.database), 2)
+        self.assertEqual(
+            snapshot.snapshot_users_db(self.path, self.database), 0)
+        reader = snapshot.Snapshot(self.path)
+        self.assertEqual(len(reader.meta["segments"]), 2)
+        self.assertEqual(reader.rows, 5)
+        self.assertEqual(reader.mean("age"), 40.0)
+        ids = np.concatenate(reader.column("id"))
+        self.assertEqual(ids.tolist(), [1, 2, 3, 4, 5])
+
+    def test_leftover_segment_is_replaced(self):
+        """Test that an interrupted export does not break the next one."""
+        make_users_db(self.database, [20, 30])
+        for leftover in ("segment-00000", "segment-00000.tmp"):
+            os.makedirs(os.path.join(self.path, leftover))
+            with open(os.path.join(self.path, leftover, "age.npy"),
+                      "wb") as file:
+                file.write(b"partial")
+        self.assertEqual(
+            snapshot.snapshot_users_db(self.path, self.database), 2)
+        reader = snapshot.Snapshot(self.path)
+        self.assertEqual(reader.mean("age"), 25.0)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.path, "segment-00000.tmp")))
+
+    def test_failed_export_leaves_nothing(self):
+        """Test that a short export removes its partial segment."""
+        os.makedirs(self.path)
+        with self.assertRaises(RuntimeError):
+            snapshot._write_segment(self.path, "segment-00000",
+                                    snapshot.USERS_DB_COLUMNS, 3,
+                                    iter([[(1, 20.0)]]))
+        self.assertEqual(os.listdir(self.path), [])
+
+
+if __name__ == "__main__":
+    unittest.main()